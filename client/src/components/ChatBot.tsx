@@ -80,6 +80,8 @@ export const ChatBot = ({ isExpanded, onToggle }: ChatBotProps) => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          // Ask for one JSON line per car so cards render as they arrive
+          'Accept': 'application/x-ndjson',
         },
         body: JSON.stringify({
           message: messageText,
@@ -101,24 +103,73 @@ export const ChatBot = ({ isExpanded, onToggle }: ChatBotProps) => {
         throw new Error(errorText);
       }
 
-      const data = await response.json();
-      console.log('✅ Received response:', data);
+      const assistantId = (Date.now() + 1).toString();
+      let assistantAdded = false;
 
-      if (data.success) {
-        // Only add message if there's content or matched cars
-        if (data.response || (data.matched_cars && data.matched_cars.length > 0)) {
+      // Add the assistant message on the first car (or text), then update it in place
+      const upsertAssistant = (update: (message: Message) => Message) => {
+        if (!assistantAdded) {
+          assistantAdded = true;
           const assistantMessage: Message = {
-            id: (Date.now() + 1).toString(),
+            id: assistantId,
             role: 'assistant',
-            content: data.response || '',  // Empty string if no text
+            content: '',
             timestamp: new Date(),
-            matchedCars: data.matched_cars || []
+            matchedCars: []
           };
+          setMessages(prev => [...prev, update(assistantMessage)]);
+        } else {
+          setMessages(prev => prev.map(m => (m.id === assistantId ? update(m) : m)));
+        }
+      };
+
+      const contentType = response.headers.get('Content-Type') || '';
+      if (contentType.includes('application/x-ndjson') && response.body) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+
+        const handleLine = (line: string) => {
+          if (!line.trim()) return;
+          const event = JSON.parse(line);
+          if (event.type === 'car') {
+            upsertAssistant(m => ({ ...m, matchedCars: [...(m.matchedCars || []), event.car] }));
+          } else if (event.type === 'done') {
+            console.log('✅ Received streamed response:', event.count, 'cars');
+            if (!event.success) {
+              throw new Error(event.error || 'Failed to get recommendation');
+            }
+            if (event.response) {
+              upsertAssistant(m => ({ ...m, content: event.response }));
+            }
+          }
+        };
 
-          setMessages(prev => [...prev, assistantMessage]);
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffered += decoder.decode(value, { stream: true });
+          const lines = buffered.split('\n');
+          buffered = lines.pop() || '';
+          lines.forEach(handleLine);
         }
+        handleLine(buffered);
       } else {
-        throw new Error(data.error || 'Failed to get recommendation');
+        const data = await response.json();
+        console.log('✅ Received response:', data);
+
+        if (data.success) {
+          // Only add message if there's content or matched cars
+          if (data.response || (data.matched_cars && data.matched_cars.length > 0)) {
+            upsertAssistant(m => ({
+              ...m,
+              content: data.response || '',  // Empty string if no text
+              matchedCars: data.matched_cars || []
+            }));
+          }
+        } else {
+          throw new Error(data.error || 'Failed to get recommendation');
+        }
       }
     } catch (error) {
       console.error('Error sending message:', error);
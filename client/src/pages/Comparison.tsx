@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo, useCallback } from 'react';
+import { useState, useEffect, useMemo, useCallback, useRef } from 'react';
 import { Header } from '../components/Header';
 import { Sidebar } from '../components/Sidebar';
 import { CarRecCard } from '../components/CarRecCard';
@@ -30,6 +30,20 @@ export const Comparison = () => {
     image?: string;
   }
 
+  interface WindowEntry {
+    index: number;
+    car: BackendCar;
+  }
+
+  interface CarWindowResponse {
+    cursor: string;
+    count: number;
+    reset: boolean;
+    left: WindowEntry | null;
+    right: WindowEntry | null;
+    prefetch: Record<'left' | 'right', { next: WindowEntry[]; prev: WindowEntry[] }>;
+  }
+
   interface UserProfile {
     budget?: number;
     credit_score?: number;
@@ -51,6 +65,22 @@ export const Comparison = () => {
   const [isChatExpanded, setIsChatExpanded] = useState(false);
   const [swipingCard, setSwipingCard] = useState<{ side: 'left' | 'right'; direction: 'left' | 'right' } | null>(null);
 
+  // Cars prefetched per side from /cars/<uid>/window. The client moves
+  // through them on its own and only asks for more when a side runs low,
+  // sending the last cursor and how far each side moved since.
+  const PREFETCH_SIZE = 3;
+  const windowCursorRef = useRef<string | null>(null);
+  const pendingStepsRef = useRef<{ left: number; right: number }>({ left: 0, right: 0 });
+  const prefetchRef = useRef<{ left: WindowEntry[]; right: WindowEntry[] }>({ left: [], right: [] });
+  const refillRef = useRef<Promise<void> | null>(null);
+
+  const resetWindow = () => {
+    windowCursorRef.current = null;
+    pendingStepsRef.current = { left: 0, right: 0 };
+    prefetchRef.current = { left: [], right: [] };
+    refillRef.current = null;
+  };
+
   const mapBackendCar = (car: BackendCar): CarCardData => {
     const entryPrice = Number(car.Entry_price ?? 0);
     const downPayment = car.down_payment != null ? Number(car.down_payment) : entryPrice * 0.1;
@@ -92,6 +122,7 @@ export const Comparison = () => {
 
         const carsResponse = await api.get(`/cars/${currentUser.uid}`);
         const fetchedCars: BackendCar[] = carsResponse?.cars || [];
+        resetWindow();
 
         if (fetchedCars.length === 0) {
           setCars([]);
@@ -120,6 +151,46 @@ export const Comparison = () => {
     fetchComparisonData();
   }, [currentUser]);
 
+  const refillWindow = useCallback((): Promise<void> => {
+    if (!currentUser) {
+      return Promise.resolve();
+    }
+    if (refillRef.current) {
+      return refillRef.current;
+    }
+
+    const sent = { ...pendingStepsRef.current };
+    const params = new URLSearchParams({
+      n: String(PREFETCH_SIZE),
+      left: String(sent.left),
+      right: String(sent.right),
+    });
+    if (windowCursorRef.current) {
+      params.set('cursor', windowCursorRef.current);
+    }
+
+    const refill = (async () => {
+      try {
+        const response: CarWindowResponse = await api.get(`/cars/${currentUser.uid}/window?${params}`);
+        // Steps taken while this request was in flight are not in its cursor yet
+        const since = {
+          left: pendingStepsRef.current.left - sent.left,
+          right: pendingStepsRef.current.right - sent.right,
+        };
+        windowCursorRef.current = response.cursor;
+        pendingStepsRef.current = since;
+        prefetchRef.current = {
+          left: response.prefetch.left.next.slice(since.left),
+          right: response.prefetch.right.next.slice(since.right),
+        };
+      } finally {
+        refillRef.current = null;
+      }
+    })();
+    refillRef.current = refill;
+    return refill;
+  }, [currentUser]);
+
   const handleAdvance = useCallback(async (side: 'left' | 'right') => {
     if (!currentUser || isAdvancing[side]) {
       return;
@@ -131,27 +202,28 @@ export const Comparison = () => {
     setIsAdvancing((prev) => ({ ...prev, [side]: true }));
     setError(null);
 
-    // Wait for animation to complete before fetching new card
+    // Wait for animation to complete before showing the new card
     await new Promise(resolve => setTimeout(resolve, 300));
 
     try {
-      const response = await api.get(`/cars/${currentUser.uid}/next?side=${side}`);
+      // Only wait on the server when nothing is prefetched for this side
+      if (prefetchRef.current[side].length === 0) {
+        await refillWindow();
+      }
+
+      const [entry, ...remaining] = prefetchRef.current[side];
 
-      if (response?.error) {
-        setError(response.message || response.error || 'Reached the end of recommendations.');
+      if (!entry) {
+        setError(`Reached the end of ${side} side recommendations`);
         setSwipingCard(null);
-        setIsAdvancing((prev) => ({ ...prev, [side]: false }));
         return;
       }
 
-      const backendCar: BackendCar | undefined = response?.car;
-      const newIndex: number | undefined = response?.index;
+      prefetchRef.current = { ...prefetchRef.current, [side]: remaining };
+      pendingStepsRef.current = { ...pendingStepsRef.current, [side]: pendingStepsRef.current[side] + 1 };
 
-      if (!backendCar || typeof newIndex !== 'number') {
-        throw new Error('Invalid response from server when fetching next car.');
-      }
-
-      const mappedCar = mapBackendCar(backendCar);
+      const newIndex = entry.index;
+      const mappedCar = mapBackendCar(entry.car);
       setCars((prev) => {
         const updated = [...prev];
         if (newIndex >= updated.length) {
@@ -162,21 +234,18 @@ export const Comparison = () => {
       });
 
       if (side === 'left') {
-        if (newIndex % 2 !== 0) {
-          console.warn(`Received odd index ${newIndex} for left card; ignoring to maintain even indices.`);
-        } else {
-          setLeftCardIndex(newIndex);
-        }
+        setLeftCardIndex(newIndex);
       } else {
-        if (newIndex % 2 === 0) {
-          console.warn(`Received even index ${newIndex} for right card; ignoring to maintain odd indices.`);
-        } else {
-          setRightCardIndex(newIndex);
-        }
+        setRightCardIndex(newIndex);
       }
 
       // Clear swipe animation after card is replaced
       setSwipingCard(null);
+
+      // Top up in the background before this side runs out
+      if (remaining.length <= 1) {
+        refillWindow().catch(() => undefined);
+      }
     } catch (err: any) {
       const message = err?.message || 'Failed to advance to the next car.';
       setError(message);
@@ -184,7 +253,7 @@ export const Comparison = () => {
     } finally {
       setIsAdvancing((prev) => ({ ...prev, [side]: false }));
     }
-  }, [currentUser, isAdvancing]);
+  }, [currentUser, isAdvancing, refillWindow]);
 
   const handleCardClick = (car: CarCardData | null) => {
     if (!car) return;
@@ -220,6 +289,7 @@ export const Comparison = () => {
         if (profile?.budget && profile?.credit_score) {
           const carsResponse = await api.get(`/cars/${currentUser.uid}`);
           const fetchedCars: BackendCar[] = carsResponse?.cars || [];
+          resetWindow();
 
           if (fetchedCars.length === 0) {
             setCars([]);
@@ -0,0 +1,76 @@
+"""
+Correctness check and micro-benchmark for the chat query parser.
+
+query_parser_corpus.json holds queries together with the intent the
+original regex extractors in ToyotaCarRAG produced for them. This script
+checks that parse_query still returns exactly that intent and then times
+it over the whole corpus.
+
+Usage:
+    python bench_query_parser.py [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from query_parser import parse_query
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BASE_DIR, 'query_parser_corpus.json')
+CSV_PATH = os.path.join(BASE_DIR, 'Toyota_price_table.csv')
+
+
+def check_corpus(corpus, cheap_price):
+    """Compare parse_query output against the recorded intents, return failures"""
+    failures = []
+    for entry in corpus:
+        intent = parse_query(entry['query'], cheap_price=cheap_price)
+        if intent['price_range'] is not None:
+            intent['price_range'] = list(intent['price_range'])
+        if intent != entry['intent']:
+            failures.append((entry['query'], entry['intent'], intent))
+    return failures
+
+
+def benchmark(queries, cheap_price, repeat):
+    """Return the mean parse time per query in microseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            parse_query(query, cheap_price=cheap_price)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * len(queries)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200, help='Passes over the corpus for timing')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        corpus = json.load(f)
+
+    # The corpus was recorded against the bundled catalog's 30% price quantile
+    cheap_max_price = pd.read_csv(CSV_PATH)['Entry_price'].quantile(0.3)
+    cheap_price = lambda: cheap_max_price
+
+    failures = check_corpus(corpus, cheap_price)
+    for query, expected, got in failures:
+        print(f"❌ {query!r}")
+        print(f"   expected: {expected}")
+        print(f"   got:      {got}")
+    print(f"{'✅' if not failures else '❌'} {len(corpus) - len(failures)}/{len(corpus)} corpus queries match")
+
+    per_query = benchmark([entry['query'] for entry in corpus], cheap_price, args.repeat)
+    print(f"⏱️  parse_query: {per_query:.1f} µs/query over {len(corpus)} queries x {args.repeat}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Search latency and memory benchmark for ToyotaCarRAG.
+
+For each catalog size, generates a synthetic catalog, builds the search
+engine on it and replays a fixed query corpus (the queries from
+query_parser_corpus.json) through search_cars with the result cache
+disabled. Queries that parse to the same intent as an earlier one are
+dropped first, because search_cars_batch scores each distinct intent only
+once; with that, --batch timings (mean per query of one batch call) are
+comparable with the per-query ones. Reports build time, p50/p95/p99 query
+latency, peak traced memory for the build and for the query run, and the
+bytes per row held by the built catalog index.
+
+Usage:
+    python bench_search.py [--sizes 1000,10000,100000,1000000] [--passes 3] [--multi-make] [--batch]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from chat_rag import ToyotaCarRAG
+from synthetic_catalog import generate_catalog
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BASE_DIR, 'query_parser_corpus.json')
+
+
+def _mib(n_bytes: float) -> float:
+    return n_bytes / (1024 * 1024)
+
+
+def distinct_intent_queries(rag, queries):
+    """The first query of each distinct parsed intent, in corpus order"""
+    index = rag.index
+    seen = set()
+    distinct = []
+    for query in queries:
+        key = rag._intent_key(rag._parse_query(query, index), query, 5, index.version)
+        if key not in seen:
+            seen.add(key)
+            distinct.append(query)
+    return distinct
+
+
+def bench_size(n_rows, queries, passes, multi_make, batch):
+    """Benchmark one catalog size, return a dict of measurements"""
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'catalog.csv')
+        generate_catalog(n_rows, multi_make=multi_make).to_csv(csv_path, index=False)
+
+        quiet = io.StringIO()
+        with contextlib.redirect_stdout(quiet):
+            tracemalloc.start()
+            start = time.perf_counter()
+            rag = ToyotaCarRAG(csv_path, cache_size=0)
+            build_seconds = time.perf_counter() - start
+            _, build_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            bytes_per_row = rag.index.memory_usage()['total'] / max(n_rows, 1)
+            queries = distinct_intent_queries(rag, queries)
+
+            latencies = []
+            for _ in range(passes):
+                if batch:
+                    start = time.perf_counter()
+                    rag.search_cars_batch(queries)
+                    latencies.append((time.perf_counter() - start) / len(queries))
+                else:
+                    for query in queries:
+                        start = time.perf_counter()
+                        rag.search_cars(query)
+                        latencies.append(time.perf_counter() - start)
+            _, search_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        'rows': n_rows,
+        'queries': len(queries),
+        'build_s': build_seconds,
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'build_peak_mib': _mib(build_peak),
+        'search_peak_mib': _mib(search_peak),
+        'bytes_per_row': bytes_per_row,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help='Comma-separated catalog sizes')
+    parser.add_argument('--passes', type=int, default=3, help='Passes over the query corpus per size')
+    parser.add_argument('--multi-make', action='store_true', help='Generate multi-make catalogs')
+    parser.add_argument('--batch', action='store_true', help='Time search_cars_batch (mean per distinct query) instead of search_cars')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH) as f:
+        queries = [entry['query'] for entry in json.load(f)]
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = []
+    for n_rows in sizes:
+        result = bench_size(n_rows, queries, args.passes, args.multi_make, args.batch)
+        results.append(result)
+        if not args.json:
+            print(
+                f"{result['rows']:>9} rows | {result['queries']} distinct queries | build {result['build_s']:7.2f}s | "
+                f"p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms | "
+                f"peak build {result['build_peak_mib']:8.1f}MiB  search {result['search_peak_mib']:8.1f}MiB | "
+                f"index {result['bytes_per_row']:6.0f}B/row"
+            )
+            sys.stdout.flush()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
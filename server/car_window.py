@@ -0,0 +1,163 @@
+"""
+Windowed navigation over a user's sorted recommendations.
+
+The Comparison page shows two cars side by side: the left side walks the
+even positions of the sorted list and the right side the odd ones. A
+window is the current left/right pair plus the next and previous few cars
+of each side, so the client can move several steps from one response.
+
+Where the client is in the list travels in an opaque cursor token rather
+than in server state. The client moves through the prefetched cars on its
+own and, when it needs more, sends back the last token together with how
+many cars it moved each side since. A token also carries a fingerprint of
+the list it was issued for; once the list changes (new budget, new
+catalog), old tokens start over from the top.
+"""
+
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Cars prefetched in each direction of each side, by default and at most
+DEFAULT_WINDOW_SIZE = 3
+MAX_WINDOW_SIZE = 20
+
+SIDES = ('left', 'right')
+# Position of each side at the top of the list
+FIRST_POSITIONS = {'left': 0, 'right': 1}
+
+
+class InvalidCursor(ValueError):
+    """A cursor token that was not issued by this server"""
+
+
+def list_fingerprint(cars: List[Dict[str, Any]]) -> str:
+    """Short hash of the car_ids of a sorted list, in order"""
+    digest = hashlib.sha1('\x1f'.join(str(car.get('car_id', '')) for car in cars).encode())
+    return digest.hexdigest()[:12]
+
+
+def encode_cursor(fingerprint: str, left: int, right: int) -> str:
+    """Cursor token for a pair of positions in the list with this fingerprint"""
+    payload = json.dumps([fingerprint, left, right], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+
+def decode_cursor(token: str) -> Tuple[str, int, int]:
+    """
+    Fingerprint and left/right positions of a cursor token
+
+    Raises:
+        InvalidCursor: The token is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        fingerprint, left, right = json.loads(payload)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Malformed cursor: {e}') from None
+    if not isinstance(fingerprint, str) or type(left) is not int or type(right) is not int:
+        raise InvalidCursor('Malformed cursor')
+    if left < 0 or right < 0 or left % 2 != 0 or right % 2 != 1:
+        raise InvalidCursor('Cursor positions out of range')
+    return fingerprint, left, right
+
+
+def last_position(n_cars: int, side: str) -> int:
+    """Last position of a side in a list of n_cars; below the first when the side is empty"""
+    last = n_cars - 1
+    if (last - FIRST_POSITIONS[side]) % 2:
+        last -= 1
+    return last
+
+
+def step(position: int, side: str, n_cars: int, steps: int) -> int:
+    """Position after moving `steps` cars on a side (negative: back), stopping at either end"""
+    target = position + 2 * steps
+    if steps > 0:
+        return min(target, max(last_position(n_cars, side), position))
+    return max(target, FIRST_POSITIONS[side])
+
+
+class CarWindow:
+    """
+    Current left/right positions in a user's sorted recommendations.
+
+    `reset` is True when the requested cursor was issued for another list,
+    so the positions started over.
+    """
+
+    def __init__(self, cars: List[Dict[str, Any]], cursor: Optional[str] = None):
+        """
+        Args:
+            cars: The user's recommendations, sorted
+            cursor: Token from an earlier window, or None to start at the top
+
+        Raises:
+            InvalidCursor: The token is malformed
+        """
+        self.cars = cars
+        self.fingerprint = list_fingerprint(cars)
+        self.positions = dict(FIRST_POSITIONS)
+        self.reset = False
+        if cursor:
+            fingerprint, left, right = decode_cursor(cursor)
+            if fingerprint == self.fingerprint:
+                self.positions = {'left': left, 'right': right}
+            else:
+                self.reset = True
+        for side in SIDES:
+            # A position past the end (only possible for a side with no
+            # cars left) is clamped like the next/prev routes do
+            self.positions[side] = min(self.positions[side], max(last_position(len(cars), side), FIRST_POSITIONS[side]))
+
+    def move(self, side: str, steps: int) -> int:
+        """Move one side `steps` cars (negative: back); returns how many it actually moved"""
+        position = step(self.positions[side], side, len(self.cars), steps)
+        moved = (position - self.positions[side]) // 2
+        self.positions[side] = position
+        return moved
+
+    def cursor(self) -> str:
+        """Token for the current positions"""
+        return encode_cursor(self.fingerprint, self.positions['left'], self.positions['right'])
+
+    def _entry(self, position: int) -> Optional[Dict[str, Any]]:
+        if position >= len(self.cars):
+            return None
+        return {'index': position, 'car': self.cars[position]}
+
+    def to_dict(self, size: int = DEFAULT_WINDOW_SIZE) -> Dict[str, Any]:
+        """
+        The window as a JSON-ready dictionary
+
+        Args:
+            size: Cars prefetched in each direction of each side
+
+        Returns:
+            Dictionary with 'cursor', 'count', 'reset', 'left' and 'right'
+            (the current pair, each {'index', 'car'} or None) and
+            'prefetch' ({side: {'next': [...], 'prev': [...]}}, nearest
+            first)
+        """
+        window = {
+            'cursor': self.cursor(),
+            'count': len(self.cars),
+            'reset': self.reset,
+            'prefetch': {},
+        }
+        for side in SIDES:
+            position = self.positions[side]
+            window[side] = self._entry(position)
+            last = last_position(len(self.cars), side)
+            window['prefetch'][side] = {
+                'next': [
+                    self._entry(p)
+                    for p in range(position + 2, min(position + 2 * size, last) + 1, 2)
+                ],
+                'prev': [
+                    self._entry(p)
+                    for p in range(position - 2, max(position - 2 * size, FIRST_POSITIONS[side]) - 1, -2)
+                ],
+            }
+        return window
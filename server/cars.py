@@ -1,13 +1,319 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from flask import jsonify, request
 from firebase_admin import firestore
 import firebase_admin.exceptions as firebase_exceptions
-import pandas as pd
-import uuid
-import os
+import numpy as np
+
+from car_window import CarWindow, InvalidCursor, DEFAULT_WINDOW_SIZE, MAX_WINDOW_SIZE
+from chat_routes import get_chat_engine
+from cursor_store import create_cursor_store
+from http_cache import data_versions, not_modified, user_etag, with_etag
+from downpayment import calculate_downpayment, calculate_downpayments, credit_tier
+from ttl_cache import TTLCache
+
+# Firestore allows at most 500 writes in one batch
+FIRESTORE_BATCH_LIMIT = 500
+
+# Loan term the stored down payments are calculated for
+DEFAULT_LOAN_TERM = 36
+
+def commit_batched(db, writes):
+    """
+    Apply (operation, document reference, data) writes, where operation is
+    'set', 'update' or 'delete', with WriteBatch commits of at most
+    FIRESTORE_BATCH_LIMIT writes each
+    """
+    for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        for operation, ref, data in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+            if operation == 'delete':
+                batch.delete(ref)
+            else:
+                getattr(batch, operation)(ref, data)
+        batch.commit()
+
+def build_car_records(index, rows):
+    """
+    Build the base car record (make, model, Entry_price, year, image_url)
+    of each catalog row from the index's columns instead of iterrows.
+    Prices and years become plain Python ints.
+    """
+    rows = np.asarray(rows)
+    return [
+        {
+            'make': index.makers[maker],
+            'model': index.model_names[code],
+            'Entry_price': int(price),
+            'year': int(year),
+            'image_url': index.image_urls[url],
+        }
+        for maker, code, price, year, url in zip(
+            index.maker_codes[rows].tolist(),
+            index.model_codes[rows].tolist(),
+            index.price[rows].tolist(),
+            index.year[rows].tolist(),
+            index.image_url_codes[rows].tolist(),
+        )
+    ]
+
+def car_downpayment(car_data, credit_score, loan_term=DEFAULT_LOAN_TERM):
+    """Down payment and rate of a car record, falling back to 10% if the calculation fails"""
+    try:
+        downpayment_result = calculate_downpayment(
+            car_price=car_data['Entry_price'],
+            credit_score=credit_score,
+            loan_term=loan_term,
+            vehicle_year=car_data['year'],
+            vehicle_model=car_data['model']
+        )
+    except Exception as e:
+        # Fallback if calculation fails
+        downpayment_result = {
+            'down_payment': car_data['Entry_price'] * 0.10,
+            'total_rate': 0.0
+        }
+    return downpayment_result.get('down_payment', 0), downpayment_result.get('total_rate', 10.0)
+
+def car_downpayments(cars, credit_score, loan_term=DEFAULT_LOAN_TERM):
+    """
+    Down payment and rate of each car record, calculated for all of them in
+    one vectorized pass; falls back to one car at a time if that fails
+    """
+    if not cars:
+        return []
+    try:
+        result = calculate_downpayments(
+            car_prices=[car_data['Entry_price'] for car_data in cars],
+            credit_scores=credit_score,
+            loan_terms=loan_term,
+            vehicle_years=[car_data['year'] for car_data in cars],
+            vehicle_models=[car_data['model'] for car_data in cars]
+        )
+        return list(zip(result['down_payment'].tolist(), result['total_rate'].tolist()))
+    except Exception as e:
+        return [car_downpayment(car_data, credit_score, loan_term) for car_data in cars]
+
+# Each user's recommendations sorted by Entry_price (descending), so next/prev
+# navigation is served from memory instead of re-reading and re-sorting the
+# user's Firestore subcollection. Entries are (version, cars) and only count
+# while their version is still the user's current 'cars' data version, so
+# a change made through another worker process invalidates them too.
+user_cars_cache = TTLCache(maxsize=4096, ttl=900.0)
+
+def sort_cars(cars):
+    """
+    Sort cars by Entry_price descending. Ties are ordered by car_id, which is
+    the order Firestore lists documents in, so the result is the same whether
+    the cars came from Firestore or were just generated.
+    """
+    return sorted(cars, key=lambda x: (-x.get('Entry_price', 0), x.get('car_id', '')))
 
-# Global variables to track indices for each user and side
-# Structure: {uid: {'left': index, 'right': index}}
-user_indices = {}
+def cached_cars_entry(uid):
+    """A user's cached (version, sorted cars), or None if missing or out of date"""
+    entry = user_cars_cache.get(uid)
+    if entry is not None and entry[0] != data_versions.get('cars', uid):
+        user_cars_cache.pop(uid)
+        return None
+    return entry
+
+def sorted_cars_entry(uid, db=None):
+    """
+    (version, sorted recommendations) of a user, reading Firestore only on
+    a cache miss. The version is taken before the read, so a change that
+    lands during it leaves the entry out of date rather than mislabelled.
+    """
+    entry = cached_cars_entry(uid)
+    if entry is not None:
+        return entry
+    version = data_versions.ensure('cars', uid)
+    db = db or firestore.client()
+    cars_docs = db.collection('user_cars').document(uid).collection('cars').get()
+    cars_list = sort_cars(doc.to_dict() for doc in cars_docs)
+    if cars_list:
+        user_cars_cache.set(uid, (version, cars_list))
+    return version, cars_list
+
+def get_sorted_cars(uid, db=None):
+    """Sorted recommendations for a user, reading Firestore only on a cache miss"""
+    return sorted_cars_entry(uid, db)[1]
+
+def remember_user_cars(uid, cars_list):
+    """Cache a user's sorted recommendations as their new latest version"""
+    user_cars_cache.set(uid, (data_versions.bump('cars', uid), cars_list))
+
+def invalidate_user_cars(uid):
+    """Forget a user's cached recommendations, e.g. after they change"""
+    user_cars_cache.pop(uid)
+    data_versions.forget('cars', uid)
+
+def user_cars_etag(catalog_version, user_version, cars_version):
+    """ETag of a /cars/<uid> response listing a user's stored cars, if any (see user_etag)"""
+    return user_etag('cars', catalog_version, user_version, cars_version)
+
+# Left/right navigation cursors for each user. In-process by default;
+# CURSOR_STORE=sqlite shares them between worker processes.
+cursor_store = create_cursor_store()
+
+# Generated recommendation lists shared between users. A list depends only
+# on how many of the price-sorted catalog rows fit the budget and on the
+# credit tier and loan term its down payments use, so users with the same
+# key get the same cars. Keyed by catalog version too, so a reloaded
+# catalog never serves lists built from the old one.
+recommendation_templates = TTLCache(maxsize=64, ttl=None)
+
+def recommendation_template(index, budget, credit_score, loan_term=DEFAULT_LOAN_TERM):
+    """
+    The complete car records (with down payments and car_id) recommended
+    for a budget and credit score, in catalog order. Built once per
+    (catalog version, budget cutoff, credit tier, loan term) and shared;
+    callers must copy the records before changing them.
+    """
+    cutoff = index.budget_cutoff(budget)
+    key = (index.version, cutoff, credit_tier(credit_score), loan_term)
+    template = recommendation_templates.get(key)
+    if template is None:
+        rows = np.sort(index.price_order[:cutoff])
+        template = build_car_records(index, rows)
+        payments = car_downpayments(template, credit_score, loan_term)
+        for car_data, (down_payment, down_payment_rate), car_id in zip(template, payments, index.car_doc_ids(rows)):
+            car_data['down_payment'] = down_payment
+            car_data['down_payment_rate'] = down_payment_rate
+            # Deterministic ID (Genmodel_ID + Year), so regenerating
+            # or retrying overwrites instead of duplicating
+            car_data['car_id'] = car_id
+        template = tuple(template)
+        recommendation_templates.set(key, template)
+    return template
+
+def sync_user_cars(uid, budget, credit_score, db=None, existing=None):
+    """
+    Bring a user's stored recommendations in line with their profile,
+    writing only the difference.
+
+    The wanted cars come from the shared recommendation template for the
+    user's budget and credit tier. Stored cars that are no longer wanted
+    are deleted, missing ones are added and kept ones are rewritten only
+    when they differ from the template (new down payments after a credit
+    tier change, or a catalog edit). The sorted result replaces the
+    cached list.
+
+    Args:
+        uid: The user's unique identifier
+        budget: The user's budget
+        credit_score: The user's credit score
+        db: Firestore client (default: firestore.client())
+        existing: The user's stored cars, if already known
+
+    Returns:
+        (sorted cars, {'added', 'removed', 'updated'} counts)
+    """
+    db = db or firestore.client()
+    cars_collection = db.collection('user_cars').document(uid).collection('cars')
+
+    if existing is None:
+        existing = get_sorted_cars(uid, db)
+
+    template = recommendation_template(get_chat_engine().index, budget, credit_score)
+    stored = {car.get('car_id'): car for car in existing}
+    wanted = {car['car_id'] for car in template}
+
+    writes = []
+    for car_id in stored:
+        if car_id not in wanted:
+            writes.append(('delete', cars_collection.document(car_id), None))
+    removed = len(writes)
+
+    cars = []
+    added = updated = 0
+    for template_car in template:
+        car_data = stored.get(template_car['car_id'])
+        if car_data != template_car:
+            if car_data is None:
+                added += 1
+            else:
+                updated += 1
+            car_data = dict(template_car)
+            writes.append(('set', cars_collection.document(car_data['car_id']), car_data))
+        cars.append(car_data)
+    commit_batched(db, writes)
+
+    cars = sort_cars(cars)
+    if not cars:
+        invalidate_user_cars(uid)
+    elif writes or cached_cars_entry(uid) is None:
+        remember_user_cars(uid, cars)
+    if added or removed:
+        # Positions in the old list mean nothing in the new one
+        cursor_store.reset(uid)
+    return cars, {'added': added, 'removed': removed, 'updated': updated}
+
+# Profile changes are synced in the background by a small pool. Syncs of
+# one user run one at a time and in order; different users never wait for
+# each other.
+SYNC_WORKERS = 4
+_sync_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix='user-cars-sync')
+_sync_lock = threading.Lock()
+# uid -> Future of the sync in progress, and of the one queued after it
+_running_syncs = {}
+_queued_syncs = {}
+
+def _run_user_cars_sync(uid):
+    try:
+        db = firestore.client()
+        user_entry = db.collection('users').document(uid).get()
+        user_data = user_entry.to_dict() if user_entry.exists else {}
+        budget = user_data.get('budget')
+        credit_score = user_data.get('credit_score')
+        if not budget or not credit_score:
+            return
+        cars, delta = sync_user_cars(uid, budget, credit_score, db=db)
+        print(f"🔄 Synced cars for {uid}: {len(cars)} cars "
+              f"(+{delta['added']} -{delta['removed']} ~{delta['updated']})")
+    except Exception as e:
+        print(f"❌ Car sync failed for {uid}: {e}")
+
+def _start_queued_sync(uid):
+    """Submit a user's queued sync; the caller holds _sync_lock"""
+    future = _queued_syncs.pop(uid)
+    _running_syncs[uid] = future
+    _sync_executor.submit(_sync_job, uid, future)
+
+def _sync_job(uid, future):
+    try:
+        _run_user_cars_sync(uid)
+    finally:
+        with _sync_lock:
+            del _running_syncs[uid]
+            if uid in _queued_syncs:
+                _start_queued_sync(uid)
+        future.set_result(None)
+
+def schedule_user_cars_sync(uid):
+    """
+    Sync a user's stored recommendations with their profile in the
+    background. The job reads the profile when it runs, so a burst of
+    updates ends with the latest one applied: while a sync of the user is
+    running, at most one more is queued behind it.
+    """
+    with _sync_lock:
+        if uid in _queued_syncs:
+            return
+        _queued_syncs[uid] = Future()
+        if uid not in _running_syncs:
+            _start_queued_sync(uid)
+
+def wait_for_user_cars_sync(uid, timeout=30.0):
+    """Block until the user's scheduled syncs, if any, have finished"""
+    with _sync_lock:
+        future = _queued_syncs.get(uid) or _running_syncs.get(uid)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            # A failed or slow sync leaves the stored list as it was
+            pass
 
 def get_cars_routes(app):
     """
@@ -15,36 +321,9 @@ def get_cars_routes(app):
     Uses Firebase Admin SDK to get cars information.
     """
     
-    def get_index(uid, side):
-        """Get the current index for a user and side."""
-        if uid not in user_indices:
-            user_indices[uid] = {'left': 0, 'right': 1}
-        return user_indices[uid][side]
-    
-    def set_index(uid, side, index):
-        """Set the index for a user and side."""
-        if uid not in user_indices:
-            user_indices[uid] = {'left': 0, 'right': 1}
-        user_indices[uid][side] = index
-    
-    def increment_index(uid, side):
-        """Increment index by 2 for a user and side."""
-        current = get_index(uid, side)
-        set_index(uid, side, current + 2)
-    
-    def decrement_index(uid, side):
-        """Decrement index by 2 for a user and side."""
-        current = get_index(uid, side)
-        new_index = current - 2
-        # Ensure index doesn't go below minimum
-        min_index = 0 if side == 'left' else 1
-        if new_index < min_index:
-            new_index = min_index
-        set_index(uid, side, new_index)
-    
     def reset_indices(uid):
         """Reset indices to initial values for a user."""
-        user_indices[uid] = {'left': 0, 'right': 1}
+        cursor_store.reset(uid)
 
     @app.route('/cars/<uid>', methods=['GET'])
     def get_cars(uid):
@@ -67,6 +346,23 @@ def get_cars_routes(app):
                     'message': 'User UID is required'
                 }), 400
 
+            # A profile update may still be syncing the stored cars
+            wait_for_user_cars_sync(uid)
+
+            # Repeat visits: if the client already has the current list,
+            # answer 304 without reading Firestore
+            user_version = data_versions.get('user', uid)
+            cars_version = data_versions.get('cars', uid)
+            if user_version and cars_version:
+                cached = not_modified(user_cars_etag(get_chat_engine().index.version, user_version, cars_version))
+                if cached is not None:
+                    reset_indices(uid)
+                    return cached
+
+            # Taken before reading, so a concurrent profile update is never
+            # tagged with the version from before it
+            user_version = data_versions.ensure('user', uid)
+
             # Initialize Firestore client
             db = firestore.client()
                 
@@ -97,82 +393,31 @@ def get_cars_routes(app):
                     'message': 'User credit score is required. Please update user profile first.'
                 }), 400
 
-            # Check if cars already exist for this user to avoid re-parsing CSV
-            cars_collection = db.collection('user_cars').document(uid).collection('cars')
-            existing_cars_docs = cars_collection.get()
+            # Reuse the cars already generated for this user: from memory
+            # when a sync or earlier visit left them there, else Firestore
+            cars_version, existing_cars = sorted_cars_entry(uid, db)
 
-            if existing_cars_docs:
-                existing_cars = [doc.to_dict() for doc in existing_cars_docs]
-                existing_cars.sort(key=lambda x: x.get('Entry_price', 0), reverse=True)
+            if existing_cars:
                 reset_indices(uid)
-                return jsonify({
+                return with_etag((jsonify({
                     'success': True,
                     'message': f'Retrieved {len(existing_cars)} previously generated cars',
                     'cars': existing_cars,
                     'count': len(existing_cars)
-                }), 200
+                }), 200), user_cars_etag(get_chat_engine().index.version, user_version, cars_version))
 
-            # Read car data from CSV
-            csv_path = os.path.join(os.path.dirname(__file__), 'Toyota_price_table.csv')
-            cars_df = pd.read_csv(csv_path)
-            
-            # Filter cars within budget
-            recommended_cars = cars_df[cars_df['Entry_price'] <= budget].copy()
-            
-            if recommended_cars.empty:
+            # Nothing stored yet: generate the cars within budget, with their
+            # down payments, and store them in Firestore under
+            # user_cars/{uid}/cars/{car_id}
+            car_recommendations, _ = sync_user_cars(uid, budget, credit_score, db=db, existing=[])
+
+            if not car_recommendations:
                 return jsonify({
                     'success': True,
                     'message': 'No cars found within your budget',
                     'cars': []
                 }), 200
 
-            # Process each car
-            car_recommendations = []
-            
-            for index, car_row in recommended_cars.iterrows():
-                # Create car JSON object
-                car_data = {
-                    'make': car_row['Maker'],
-                    'model': car_row['Genmodel'],
-                    'Entry_price': int(car_row['Entry_price']),
-                    'year': int(car_row['Year']),
-                    'image_url': car_row['Image_url']
-                }
-                
-                # Calculate downpayment using the downpayment module
-                try:
-                    from downpayment import calculate_downpayment
-                    
-                    # Calculate downpayment using the reusable function
-                    downpayment_result = calculate_downpayment(
-                        car_price=car_data['Entry_price'],
-                        credit_score=credit_score,
-                        loan_term=36,  # Default 60 months (5 years)
-                        vehicle_year=car_data['year'],
-                        vehicle_model=car_data['model']
-                    )
-                except Exception as e:
-                    # Fallback if calculation fails
-                    downpayment_result = {
-                        'down_payment': car_data['Entry_price'] * 0.10,
-                        'total_rate': 0.0
-                    }
-                
-                # Add downpayment to car data
-                car_data['down_payment'] = downpayment_result.get('down_payment', 0)
-                car_data['down_payment_rate'] = downpayment_result.get('total_rate', 10.0)
-                
-                # Generate unique ID for this car recommendation
-                car_id = str(uuid.uuid4())
-                car_data['car_id'] = car_id
-                
-                # Store in Firestore under user_cars collection
-                # Structure: user_cars/{uid}/cars/{car_id}
-                car_ref = db.collection('user_cars').document(uid).collection('cars').document(car_id)
-                car_ref.set(car_data)
-                
-                car_recommendations.append(car_data)
-
             # Reset indices when new cars are generated
             reset_indices(uid)
 
@@ -196,6 +441,85 @@ def get_cars_routes(app):
                 'message': f'An unexpected error occurred: {str(e)}'
             }), 500
 
+    @app.route('/cars/<uid>/window', methods=['GET'])
+    def get_car_window(uid):
+        """
+        Get the current left/right pair plus the next and previous cars of
+        each side in one response.
+
+        Positions travel in the opaque `cursor` token instead of the
+        server-side cursors. The client moves through the prefetched cars
+        on its own and asks for the next window with its last cursor and
+        the number of cars it moved each side since.
+
+        Parameters:
+            uid: The user's unique identifier
+            cursor: Query parameter - token from an earlier window (default: top of the list)
+            left: Query parameter - cars to move the left side from the cursor, negative to go back (default 0)
+            right: Query parameter - cars to move the right side from the cursor (default 0)
+            n: Query parameter - cars prefetched in each direction of each side (default 3, max 20)
+
+        Returns:
+            JSON response with cursor, left, right, prefetch, count, moved and reset
+        """
+        try:
+            # Validate UID
+            if not uid:
+                return jsonify({
+                    'error': 'Missing UID',
+                    'message': 'User UID is required'
+                }), 400
+
+            try:
+                steps = {side: int(request.args.get(side, 0)) for side in ['left', 'right']}
+                size = int(request.args.get('n', DEFAULT_WINDOW_SIZE))
+            except ValueError:
+                return jsonify({
+                    'error': 'Invalid parameter',
+                    'message': 'left, right and n must be integers'
+                }), 400
+            size = max(0, min(size, MAX_WINDOW_SIZE))
+
+            # A profile update may still be syncing the stored cars
+            wait_for_user_cars_sync(uid)
+
+            # The window only depends on the list and the query parameters
+            cars_version = data_versions.get('cars', uid)
+            if cars_version:
+                cached = not_modified(user_etag('window', cars_version, per_request=True))
+                if cached is not None:
+                    return cached
+
+            # Sorted cars for this user, from memory unless the cache missed
+            cars_version, cars_list = sorted_cars_entry(uid)
+
+            if not cars_list:
+                return jsonify({
+                    'error': 'No cars found',
+                    'message': 'No car recommendations found. Please call /cars/<uid> first to generate recommendations.'
+                }), 404
+
+            try:
+                window = CarWindow(cars_list, request.args.get('cursor'))
+            except InvalidCursor as e:
+                return jsonify({
+                    'error': 'Invalid cursor',
+                    'message': str(e)
+                }), 400
+
+            moved = {side: window.move(side, count) for side, count in steps.items()}
+
+            result = window.to_dict(size)
+            result['success'] = True
+            result['moved'] = moved
+            return with_etag((jsonify(result), 200), user_etag('window', cars_version, per_request=True))
+
+        except Exception as e:
+            return jsonify({
+                'error': 'Server error',
+                'message': f'An unexpected error occurred: {str(e)}'
+            }), 500
+
     @app.route('/cars/<uid>/next', methods=['GET'])
     def get_next_car(uid):
         """
@@ -225,56 +549,38 @@ def get_cars_routes(app):
                     'message': "Side must be 'left' or 'right'"
                 }), 400
 
-            # Initialize Firestore client
-            db = firestore.client()
-
-            # Get all cars for this user
-            cars_ref = db.collection('user_cars').document(uid).collection('cars')
-            cars_docs = cars_ref.get()
+            # Sorted cars for this user, from memory unless the cache missed
+            cars_list = get_sorted_cars(uid)
 
-            if not cars_docs:
+            if not cars_list:
                 return jsonify({
                     'error': 'No cars found',
                     'message': 'No car recommendations found. Please call /cars/<uid> first to generate recommendations.'
                 }), 404
 
-            # Convert to list and sort by Entry_price (descending)
-            cars_list = []
-            for doc in cars_docs:
-                car_data = doc.to_dict()
-                cars_list.append(car_data)
-            
-            # Sort by Entry_price descending
-            cars_list.sort(key=lambda x: x.get('Entry_price', 0), reverse=True)
-
-            # Get current index from global variable
-            current_index = get_index(uid, side)
-
-            # Calculate next index (increment by 2)
-            next_index = current_index + 2
-            
             # Determine max index based on side
             # Left side uses even indices: 0, 2, 4, 6...
             # Right side uses odd indices: 1, 3, 5, 7...
-            if side == 'left':
-                # Find the largest even index <= len(cars_list) - 1
-                max_index = len(cars_list) - 1
-                if max_index % 2 != 0:  # If max is odd, use the previous even
-                    max_index = max_index - 1
-                # Ensure we stay on even indices and don't exceed max
-                if next_index > max_index:
-                    next_index = max_index
-            else:  # right side
-                # Find the largest odd index <= len(cars_list) - 1
-                max_index = len(cars_list) - 1
-                if max_index % 2 == 0:  # If max is even, use the previous odd
-                    max_index = max_index - 1
-                # Ensure we stay on odd indices and don't exceed max
-                if next_index > max_index:
-                    next_index = max_index
+            max_index = len(cars_list) - 1
+            if side == 'left' and max_index % 2 != 0:
+                # If max is odd, use the previous even
+                max_index = max_index - 1
+            elif side == 'right' and max_index % 2 == 0:
+                # If max is even, use the previous odd
+                max_index = max_index - 1
+
+            def advance(current_index):
+                """Next index (increment by 2, capped at max), or None at the end"""
+                next_index = min(current_index + 2, max_index)
+                if next_index >= len(cars_list) or (side == 'left' and next_index % 2 != 0) or (side == 'right' and next_index % 2 == 0):
+                    return None
+                return next_index
+
+            # Read and move the cursor in one atomic step
+            current_index, next_index = cursor_store.update(uid, side, advance)
 
             # Check if we've reached the end
-            if next_index >= len(cars_list) or (side == 'left' and next_index % 2 != 0) or (side == 'right' and next_index % 2 == 0):
+            if next_index is None:
                 return jsonify({
                     'error': 'End of list',
                     'message': f'Reached the end of {side} side recommendations',
@@ -285,9 +591,6 @@ def get_cars_routes(app):
             # Get the car at the next index
             car = cars_list[next_index]
 
-            # Update global index
-            set_index(uid, side, next_index)
-
             return jsonify({
                 'success': True,
                 'side': side,
@@ -330,50 +633,30 @@ def get_cars_routes(app):
                     'message': "Side must be 'left' or 'right'"
                 }), 400
 
-            # Initialize Firestore client
-            db = firestore.client()
-
-            # Get all cars for this user
-            cars_ref = db.collection('user_cars').document(uid).collection('cars')
-            cars_docs = cars_ref.get()
+            # Sorted cars for this user, from memory unless the cache missed
+            cars_list = get_sorted_cars(uid)
 
-            if not cars_docs:
+            if not cars_list:
                 return jsonify({
                     'error': 'No cars found',
                     'message': 'No car recommendations found. Please call /cars/<uid> first to generate recommendations.'
                 }), 404
 
-            # Convert to list and sort by Entry_price (descending)
-            cars_list = []
-            for doc in cars_docs:
-                car_data = doc.to_dict()
-                cars_list.append(car_data)
-            
-            # Sort by Entry_price descending
-            cars_list.sort(key=lambda x: x.get('Entry_price', 0), reverse=True)
-
-            # Get current index from global variable
-            current_index = get_index(uid, side)
-
-            # Calculate previous index (decrement by 2)
-            prev_index = current_index - 2
-
             # Determine min index based on side
             # Left side uses even indices: 0, 2, 4, 6...
             # Right side uses odd indices: 1, 3, 5, 7...
-            if side == 'left':
-                min_index = 0
-                # Ensure we stay on even indices
-                if prev_index < min_index:
-                    prev_index = min_index
-            else:  # right side
-                min_index = 1
-                # Ensure we stay on odd indices
-                if prev_index < min_index:
-                    prev_index = min_index
+            min_index = 0 if side == 'left' else 1
+
+            def retreat(current_index):
+                """Previous index (decrement by 2, floored at min), or None at the beginning"""
+                prev_index = max(current_index - 2, min_index)
+                return None if prev_index < 0 else prev_index
+
+            # Read and move the cursor in one atomic step
+            current_index, prev_index = cursor_store.update(uid, side, retreat)
 
             # Check if we've reached the beginning
-            if prev_index < 0:
+            if prev_index is None:
                 return jsonify({
                     'error': 'At beginning',
                     'message': f'Already at the beginning of {side} side recommendations',
@@ -384,9 +667,6 @@ def get_cars_routes(app):
             # Get the car at the previous index
             car = cars_list[prev_index]
 
-            # Update global index
-            set_index(uid, side, prev_index)
-
             return jsonify({
                 'success': True,
                 'side': side,
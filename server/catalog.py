@@ -0,0 +1,515 @@
+"""
+Column-oriented index over the car catalog.
+
+The index is built once when a catalog is loaded and never mutated
+afterwards, so search code can read its arrays without copying the
+underlying DataFrame on every query. CatalogHolder swaps in a freshly
+built index when the catalog file changes.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from facet_index import FacetIndex
+from search_scoring import base_scores, build_tag_matrix
+from term_index import build_term_index
+from vector_index import VectorIndex
+
+
+# Rows serialized per chunk when building the JSON fragments
+SERIALIZE_CHUNK_ROWS = 65536
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    """Mark an array read-only so the index cannot be mutated by callers"""
+    array.setflags(write=False)
+    return array
+
+
+# Text columns stored as categoricals by compact_catalog
+CATEGORICAL_COLUMNS = ('Maker', 'Genmodel', 'Genmodel_ID', 'Image_url')
+
+
+def compact_catalog(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Catalog DataFrame with compact column types
+
+    Text columns become categoricals, so each distinct model, maker and
+    image URL string is stored once and rows only hold small integer codes.
+    Year becomes int16, and price and mileage int32 when they are whole
+    numbers in range. Mileage with gaps becomes float32, which is exact for
+    any realistic mileage; fractional prices stay float64.
+
+    Args:
+        df: Catalog as read from the CSV, already cleaned
+
+    Returns:
+        New DataFrame with a fresh RangeIndex
+    """
+    types = {column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns}
+    if 'Year' in df.columns:
+        types['Year'] = np.int16
+    for column in ('Entry_price', 'mileage'):
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if values.notna().all() and (values % 1 == 0).all() and values.abs().max() < 2 ** 31:
+            types[column] = np.int32
+        elif column == 'mileage':
+            types[column] = np.float32
+    return df.reset_index(drop=True).astype(types)
+
+
+def _interned(df: pd.DataFrame, column: str, default: Any) -> tuple:
+    """
+    Distinct values of a text column and each row's code into them
+
+    Missing values get code -1, which indexes the None appended after the
+    distinct values. A missing column is a single `default` value. The
+    codes of a categorical column are used as they are, without a copy.
+    """
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=np.int8), np.array([default, None], dtype=object)
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), np.array(list(values.cat.categories) + [None], dtype=object)
+    codes, uniques = pd.factorize(values)
+    return codes.astype(np.int32), np.array(list(uniques) + [None], dtype=object)
+
+
+# Price quantiles precomputed by CatalogStats; 0.3 is the "cheap" cutoff and
+# 0.3/0.8/1.0 are the semantic price band bounds
+PRICE_QUANTILES = (0.1, 0.25, 0.3, 0.5, 0.75, 0.8, 0.9, 1.0)
+
+
+class CatalogStats:
+    """
+    Catalog-wide statistics, computed once per catalog snapshot.
+
+    Scoring and query parsing read these instead of reducing whole columns
+    on every query. An empty catalog has zeros everywhere.
+
+    Attributes:
+        min_year, max_year: Oldest and newest model year
+        min_price, max_price, median_price: Price extremes and median
+        price_quantiles: Price at each quantile in PRICE_QUANTILES
+        model_price_ranges: (min price, max price) per model name
+        body_type_median_prices: Median price per inferred body type
+    """
+
+    def __init__(self, index):
+        """
+        Args:
+            index: CatalogIndex with its year, price and model arrays set
+        """
+        price = index.price
+        year = index.year
+        self.rows = len(price)
+        if self.rows == 0:
+            self.min_year = self.max_year = 0
+            self.min_price = self.max_price = self.median_price = 0.0
+            self.price_quantiles = {q: 0.0 for q in PRICE_QUANTILES}
+            self.model_price_ranges = {}
+            self.body_type_median_prices = {}
+            return
+
+        self.min_year = int(year.min())
+        self.max_year = int(year.max())
+        self.min_price = float(price.min())
+        self.max_price = float(price.max())
+        self.median_price = float(np.median(price))
+        self.price_quantiles = dict(zip(PRICE_QUANTILES, np.quantile(price, PRICE_QUANTILES).tolist()))
+
+        by_model = pd.Series(price).groupby(index.model_codes).agg(['min', 'max'])
+        self.model_price_ranges = {
+            index.model_names[code]: (float(low), float(high))
+            for code, low, high in zip(by_model.index, by_model['min'], by_model['max'])
+        }
+        by_body_type = pd.Series(price).groupby(index.model_body_types[index.model_codes]).median()
+        self.body_type_median_prices = {body_type: float(median) for body_type, median in by_body_type.items()}
+
+    def price_quantile(self, q: float) -> float:
+        """Precomputed price quantile; `q` must be one of PRICE_QUANTILES"""
+        return self.price_quantiles[q]
+
+
+def _array_bytes(*arrays) -> int:
+    return sum(array.nbytes for array in arrays if isinstance(array, np.ndarray))
+
+
+class CatalogIndex:
+    """
+    Immutable NumPy view of a catalog DataFrame.
+
+    Per-row arrays (`year`, `price`, `mileage`, `model_codes` and
+    `base_scores`) line up with the rows of `df`; `price_order` lists the
+    rows by ascending price and `sorted_prices` their prices. Per-model arrays
+    (`model_names`, `model_names_lower`, `model_body_types` and the
+    `model_tags` matrix) are indexed by the integer codes in `model_codes`,
+    so string work only has to be done once per distinct model rather than
+    once per row. `stats` holds the precomputed CatalogStats, `terms` the
+    typo-tolerant TermIndex over model names and query vocabulary, `vectors`
+    the semantic VectorIndex and `facets` the FacetIndex of per-value row
+    bitsets for facet counts.
+
+    Every row's numbers are also serialized once to JSON, kept back to
+    back in `fragments` with row i at
+    `fragments[fragment_offsets[i]:fragment_offsets[i + 1]]`; the string
+    fields are serialized once per distinct value, so a car's JSON object
+    (the car dictionary returned by search) is a few byte strings joined.
+
+    Text columns are stored once per distinct value: `image_urls`, `makers`
+    and `genmodel_ids` are indexed by `image_url_codes`, `maker_codes` and
+    `genmodel_id_codes`.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        infer_body_type: Callable[[str], str],
+        version: str = '',
+        vector_cache_dir: Optional[str] = None,
+    ):
+        """
+        Build the index from a cleaned catalog DataFrame
+
+        Args:
+            df: Catalog with at least Genmodel, Year and Entry_price columns
+            infer_body_type: Function mapping a model name to its body type
+            version: Identifies the catalog contents (e.g. a file hash)
+            vector_cache_dir: Where to keep the semantic vector files, or
+                None to build them in memory
+        """
+        self.version = version
+        self.df = df.reset_index(drop=True)
+
+        codes, uniques = pd.factorize(self.df['Genmodel'])
+        self.model_codes = _frozen(codes.astype(np.int32))
+        self.model_names = _frozen(np.asarray(uniques, dtype=object))
+        self.model_names_lower = _frozen(np.array([name.lower() for name in uniques], dtype=object))
+        self.model_body_types = _frozen(np.array([infer_body_type(name) for name in uniques], dtype=object))
+
+        self.year = _frozen(self.df['Year'].to_numpy())
+        self.price = _frozen(self.df['Entry_price'].to_numpy())
+        self.mileage = _frozen(self.df['mileage'].to_numpy()) if 'mileage' in self.df.columns else None
+        url_codes, self.image_urls = _interned(self.df, 'Image_url', '')
+        maker_codes, self.makers = _interned(self.df, 'Maker', 'Toyota')
+        genmodel_codes, self.genmodel_ids = _interned(self.df, 'Genmodel_ID', None)
+        self.image_url_codes = _frozen(url_codes)
+        self.maker_codes = _frozen(maker_codes)
+        self.genmodel_id_codes = _frozen(genmodel_codes)
+        _frozen(self.image_urls)
+        _frozen(self.makers)
+        _frozen(self.genmodel_ids)
+
+        # 0 for the first row of each (Genmodel_ID, Year) pair, 1 for its first repeat, ...
+        self.variant_numbers = _frozen(
+            pd.Series(self.year).groupby([self.genmodel_id_codes, self.year]).cumcount().to_numpy().astype(np.int32)
+        )
+
+        # Rows ordered by price, so budget cutoffs are a binary search
+        self.price_order = _frozen(np.argsort(self.price, kind='stable').astype(np.int32))
+        self.sorted_prices = _frozen(self.price[self.price_order])
+
+        # Catalog-wide statistics, then query-independent scoring inputs
+        self.stats = CatalogStats(self)
+        self.base_scores = _frozen(base_scores(self))
+        model_tags, self.tag_columns = build_tag_matrix(self)
+        self.model_tags = _frozen(model_tags)
+
+        # Exact and typo-tolerant lookup of model names and vocabulary
+        self.terms = build_term_index(self.model_names)
+
+        # Semantic vectors for blending with the rule scores
+        self.vectors = VectorIndex(self, cache_dir=vector_cache_dir)
+
+        # Row bitsets per facet value for live facet counts
+        self.facets = FacetIndex(self)
+
+        # Ready-to-emit JSON for every row
+        self.fragments, offsets = self._serialize_rows()
+        self.fragment_offsets = _frozen(offsets)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def _serialize_rows(self) -> tuple:
+        """
+        Serialize the per-row numbers of every row to JSON
+
+        Each fragment opens a car object and holds mileage, price and year;
+        car_fragments completes it with the model and maker parts, which are
+        serialized once per distinct value, and the image URL. URLs are
+        mostly unique per row, so they are escaped when emitted rather than
+        stored a second time.
+
+        Returns:
+            (all fragments as one bytes object, offsets of length rows + 1,
+            uint32 when the fragments fit in 4 GiB)
+        """
+        self._model_json = [
+            f',"model":{json.dumps(name)},"body_type":{json.dumps(body_type)}'.encode('ascii')
+            for name, body_type in zip(self.model_names, self.model_body_types)
+        ]
+        self._maker_json = [f',"maker":{json.dumps(maker)},"image_url":'.encode('ascii') for maker in self.makers]
+        mileage = self.mileage if self.mileage is not None else np.full(len(self), np.nan)
+
+        parts = []
+        lengths = np.zeros(len(self) + 1, dtype=np.int64)
+        for start in range(0, len(self), SERIALIZE_CHUNK_ROWS):
+            stop = min(start + SERIALIZE_CHUNK_ROWS, len(self))
+            chunk = [
+                f'{{"mileage":{"null" if miles != miles else int(miles)},"price":{price!r},"year":{year}'
+                for miles, price, year in zip(
+                    mileage[start:stop].tolist(),
+                    self.price[start:stop].astype(float).tolist(),
+                    self.year[start:stop].astype(np.int64).tolist(),
+                )
+            ]
+            # Numbers only, so characters == bytes
+            lengths[start + 1:stop + 1] = [len(fragment) for fragment in chunk]
+            parts.append(''.join(chunk).encode('ascii'))
+        offsets = np.cumsum(lengths)
+        if offsets[-1] < 2 ** 32:
+            offsets = offsets.astype(np.uint32)
+        return b''.join(parts), offsets
+
+    def car_fragments(self, rows) -> List[bytes]:
+        """Serialized JSON object of each row in `rows`"""
+        rows = np.asarray(rows)
+        starts = self.fragment_offsets[rows].tolist()
+        stops = self.fragment_offsets[rows + 1].tolist()
+        return [
+            b''.join((
+                self.fragments[start:stop], self._model_json[code], self._maker_json[maker],
+                json.dumps(self.image_urls[url]).encode('ascii'), b'}',
+            ))
+            for start, stop, code, maker, url in zip(
+                starts,
+                stops,
+                self.model_codes[rows].tolist(),
+                self.maker_codes[rows].tolist(),
+                self.image_url_codes[rows].tolist(),
+            )
+        ]
+
+    def cars_json(self, rows) -> bytes:
+        """JSON array of the cars in `rows`, in order"""
+        return b'[' + b','.join(self.car_fragments(rows)) + b']'
+
+    def car_dicts(self, rows) -> List[Dict[str, Any]]:
+        """Car dictionaries of the rows in `rows`, in order"""
+        rows = np.asarray(rows)
+        codes = self.model_codes[rows].tolist()
+        mileage = self.mileage[rows].tolist() if self.mileage is not None else [None] * len(rows)
+        return [
+            {
+                'model': self.model_names[code],
+                'year': int(year),
+                'price': float(price),
+                'mileage': int(miles) if miles is not None and miles == miles else None,
+                'image_url': self.image_urls[url],
+                'body_type': self.model_body_types[code],
+                'maker': self.makers[maker],
+            }
+            for code, year, price, miles, url, maker in zip(
+                codes,
+                self.year[rows].tolist(),
+                self.price[rows].tolist(),
+                mileage,
+                self.image_url_codes[rows].tolist(),
+                self.maker_codes[rows].tolist(),
+            )
+        ]
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Approximate bytes held by each part of the index
+
+        Strings shared between the DataFrame's categoricals and the index's
+        per-value arrays are counted once, with the DataFrame. `vectors` is
+        memory-mapped from the vector cache when one is configured, so its
+        pages are shared between processes.
+        """
+        usage = {
+            'dataframe': int(self.df.memory_usage(deep=True).sum()),
+            'arrays': _array_bytes(
+                self.model_codes, self.model_names, self.model_names_lower, self.model_body_types,
+                self.image_urls, self.makers, self.base_scores, self.model_tags,
+                self.price_order, self.sorted_prices, self.genmodel_ids, self.variant_numbers,
+            ) + sum(
+                # Views of DataFrame columns are already counted
+                array.nbytes for array in (self.year, self.price, self.mileage, self.image_url_codes, self.maker_codes)
+                if array is not None and array.base is None
+            ),
+            'fragments': len(self.fragments) + self.fragment_offsets.nbytes + sum(
+                len(part) for parts in (self._model_json, self._maker_json) for part in parts
+            ),
+            'facets': sum(bits.nbytes for bits in self.facets.bits.values()),
+            'vectors': sum(
+                array.nbytes for array in vars(self.vectors).values() if isinstance(array, np.ndarray)
+            ),
+        }
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def report_memory(self, label: str = 'Catalog'):
+        """Print the index's memory use per catalog row"""
+        usage = self.memory_usage()
+        rows = max(len(self), 1)
+        parts = ', '.join(f'{name} {usage[name] / rows:.0f}' for name in usage if name != 'total')
+        print(f"📦 {label} memory: {usage['total'] / rows:.0f} bytes/row over {len(self)} rows ({parts})")
+
+    def car_doc_ids(self, rows) -> List[str]:
+        """
+        Deterministic document ID of each row: '<Genmodel_ID>_<Year>', with
+        '_2', '_3', ... for later rows repeating the same pair. The model
+        name stands in for a missing Genmodel_ID.
+        """
+        rows = np.asarray(rows)
+        doc_ids = []
+        for genmodel, code, year, variant in zip(
+            self.genmodel_id_codes[rows].tolist(),
+            self.model_codes[rows].tolist(),
+            self.year[rows].tolist(),
+            self.variant_numbers[rows].tolist(),
+        ):
+            base = self.genmodel_ids[genmodel]
+            doc_id = f'{base if base is not None else self.model_names[code]}_{year}'.replace('/', '-')
+            doc_ids.append(doc_id if variant == 0 else f'{doc_id}_{variant + 1}')
+        return doc_ids
+
+    def budget_cutoff(self, budget: float) -> int:
+        """Number of rows priced at or below `budget`: O(log n) on the sorted prices"""
+        return int(np.searchsorted(self.sorted_prices, budget, side='right'))
+
+    def rows_within_budget(self, budget: float) -> np.ndarray:
+        """Rows priced at or below `budget`, cheapest first (a view, no copy)"""
+        return self.price_order[:self.budget_cutoff(budget)]
+
+    def model_contains(self, model: str) -> np.ndarray:
+        """
+        Which distinct models contain `model` in their name (case-insensitive)
+
+        Args:
+            model: Model name to look for
+
+        Returns:
+            Boolean array indexed by model code
+        """
+        needle = model.lower()
+        return np.array([needle in name for name in self.model_names_lower], dtype=bool)
+
+    def body_type_mask(self, body_types) -> np.ndarray:
+        """Boolean row mask for rows whose inferred body type is in `body_types`"""
+        hits = np.isin(self.model_body_types, list(body_types))
+        return hits[self.model_codes]
+
+
+class CatalogHolder:
+    """
+    Keeps the current catalog snapshot for a CSV file and hot-reloads it.
+
+    `current()` returns the live snapshot. At most every `poll_interval`
+    seconds it also stats the source file; when the mtime or size changes
+    and the content hash differs, the new snapshot is built on a background
+    thread and swapped in with a single reference assignment. Callers that
+    already hold the old snapshot keep using it until they finish.
+    """
+
+    def __init__(
+        self,
+        csv_path: str,
+        build: Callable[[Any, str], Any],
+        poll_interval: float = 2.0,
+        on_swap: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        Load the catalog synchronously and start watching the file
+
+        Args:
+            csv_path: Path to the catalog CSV
+            build: Builds a snapshot from (file object, version string)
+            poll_interval: Minimum seconds between file checks
+            on_swap: Called with the new snapshot after each reload
+        """
+        self.csv_path = csv_path
+        self.poll_interval = poll_interval
+        self._build = build
+        self._on_swap = on_swap
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._last_check = time.monotonic()
+        self._signature = self._stat()
+        self._content_hash, self._snapshot = self._load()
+
+    @property
+    def version(self) -> str:
+        """Content hash of the catalog file the live snapshot was built from"""
+        return self._content_hash
+
+    def _stat(self) -> tuple:
+        stat = os.stat(self.csv_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self) -> tuple:
+        """Read the file once, hash it and build a snapshot from the same bytes"""
+        with open(self.csv_path, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha1(data).hexdigest()[:16]
+        return content_hash, self._build(io.BytesIO(data), content_hash)
+
+    def current(self):
+        """Return the live snapshot, scheduling a reload if the file changed"""
+        now = time.monotonic()
+        if now - self._last_check >= self.poll_interval:
+            self._last_check = now
+            self._check_for_changes()
+        return self._snapshot
+
+    def _check_for_changes(self):
+        try:
+            signature = self._stat()
+        except OSError:
+            return
+        with self._lock:
+            if signature == self._signature or self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, args=(signature,), daemon=True).start()
+
+    def _rebuild(self, signature: tuple):
+        try:
+            content_hash, snapshot = self._load()
+            if content_hash != self._content_hash:
+                self._swap(content_hash, snapshot)
+            self._signature = signature
+        except Exception as e:
+            # Keep serving the old snapshot; the next check retries
+            print(f"❌ Catalog reload failed for {self.csv_path}: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _swap(self, content_hash: str, snapshot):
+        self._content_hash = content_hash
+        self._snapshot = snapshot
+        print(f"🔄 Catalog reloaded from {self.csv_path} (version {content_hash})")
+        if self._on_swap is not None:
+            self._on_swap(snapshot)
+
+    def reload(self):
+        """Reload the catalog now, on the calling thread"""
+        signature = self._stat()
+        content_hash, snapshot = self._load()
+        if content_hash != self._content_hash:
+            self._swap(content_hash, snapshot)
+        self._signature = signature
@@ -1,33 +1,119 @@
 import pandas as pd
 import numpy as np
 from typing import List, Dict, Any, Optional
-import re
 import os
 
+from catalog import CatalogHolder, CatalogIndex, compact_catalog
+from chat_sessions import ChatSession, filter_mask, plan_follow_up, reweighted_scores, session_key
+from facet_index import PRICE_RANGE
+from query_parser import parse_query
+from search_scoring import fallback_scores, score_intent, score_intents, select_rows, top_k
+from ttl_cache import TTLCache
+from vector_index import query_words
+
 class ToyotaCarRAG:
     """
     RAG (Retrieval-Augmented Generation) system for Toyota car recommendations.
     Searches through CSV data and returns relevant car matches.
     """
     
-    def __init__(self, csv_path: str = "Toyota_price_table.csv"):
+    def __init__(
+        self, 
+        csv_path: str = "Toyota_price_table.csv", 
+        cache_size: int = 1024, 
+        cache_ttl: Optional[float] = 300.0,
+        reload_interval: float = 2.0,
+        semantic_weight: float = 10.0,
+        vector_cache_dir: Optional[str] = None,
+        session_limit: int = 2048,
+        session_ttl: Optional[float] = 1800.0,
+        session_candidates: int = 256
+    ):
         """
         Initialize the RAG system with Toyota car data
         
         Args:
             csv_path: Path to the Toyota price table CSV
+            cache_size: Maximum number of cached search results
+            cache_ttl: Seconds a cached search result stays valid
+            reload_interval: Minimum seconds between checks of the CSV for changes
+            semantic_weight: Points added per unit of semantic similarity
+                between the query and a car (0 disables the semantic stage)
+            vector_cache_dir: Directory for the memory-mapped vector files
+                (defaults to .vector_cache next to the CSV)
+            session_limit: Maximum number of chat sessions kept in memory
+            session_ttl: Seconds an idle chat session is kept
+            session_candidates: Candidate rows kept per chat session for
+                refining follow-up messages
         """
-        # Load CSV data
-        self.df = pd.read_csv(csv_path)
-        
-        # Clean data - remove rows with missing essential fields
-        self.df = self.df.dropna(subset=['Entry_price', 'Year', 'Genmodel'])
-        
         # Create model type mapping (infer from model names)
         self.model_type_map = self._create_model_type_map()
         
+        # Semantic retrieval is blended into the rule-based relevance scores
+        self.semantic_weight = semantic_weight
+        self.vector_cache_dir = vector_cache_dir or os.path.join(
+            os.path.dirname(os.path.abspath(csv_path)), '.vector_cache'
+        )
+        
+        # Search results keyed by catalog version and normalized query intent
+        self.result_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        
+        # Chat sessions keyed by the conversation's user messages (LRU-bounded)
+        self.sessions = TTLCache(maxsize=session_limit, ttl=session_ttl)
+        self.session_candidates = session_candidates
+        
+        # Load CSV data and build the search index; the holder rebuilds it
+        # in the background whenever the CSV changes
+        self.catalog = CatalogHolder(
+            csv_path, 
+            self._build_index, 
+            poll_interval=reload_interval, 
+            on_swap=self._on_catalog_swap
+        )
+        
         print(f"✅ ToyotaCarRAG initialized with {len(self.df)} vehicles")
     
+    def _build_index(self, source, version: str) -> CatalogIndex:
+        """
+        Load catalog CSV data and build its immutable search index
+        
+        Args:
+            source: Path or file object with the Toyota price table CSV
+            version: Identifies the catalog contents
+        """
+        df = pd.read_csv(source)
+        
+        # Clean data - remove rows with missing essential fields
+        df = df.dropna(subset=['Entry_price', 'Year', 'Genmodel'])
+        
+        # Categorical text and narrow numeric columns keep per-worker memory down
+        df = compact_catalog(df)
+        
+        # Body types, model codes, years and prices are computed once here
+        # so search_cars never has to copy or re-scan the DataFrame
+        index = CatalogIndex(df, self._infer_body_type, version=version, vector_cache_dir=self.vector_cache_dir)
+        index.report_memory()
+        return index
+    
+    def _on_catalog_swap(self, index: CatalogIndex):
+        """Drop cached results ranked against the previous catalog"""
+        self.result_cache.clear()
+        print(f"✅ ToyotaCarRAG reloaded with {len(index)} vehicles")
+    
+    @property
+    def index(self) -> CatalogIndex:
+        """Live catalog snapshot; read it once per request and keep using that object"""
+        return self.catalog.current()
+    
+    @property
+    def df(self) -> pd.DataFrame:
+        """Cleaned catalog DataFrame of the live snapshot"""
+        return self.index.df
+    
+    def reload_catalog(self):
+        """Reload the catalog CSV now instead of waiting for the next change check"""
+        self.catalog.reload()
+    
     def _create_model_type_map(self) -> Dict[str, str]:
         """Create a mapping of model names to body types"""
         model_type_map = {
@@ -71,404 +157,334 @@ class ToyotaCarRAG:
                 return body_type
         return 'Unknown'
     
-    def _extract_price_range(self, query: str) -> Optional[tuple]:
-        """Extract price range from user query"""
-        query_lower = query.lower()
-        
-        # Handle "cheap" or "affordable" without specific numbers
-        if any(word in query_lower for word in ['cheap', 'affordable', 'budget', 'inexpensive']):
-            if not re.search(r'\d+', query_lower):
-                # No specific number, return cheapest 30%
-                max_price = self.df['Entry_price'].quantile(0.3)
-                return (0, max_price)
-        
-        # Enhanced patterns for price extraction
-        # Range patterns (check first)
-        range_patterns = [
-            (r'between\s*\$?\s*(\d+)[,.]?(\d*)\s*k?\s*and\s*\$?\s*(\d+)[,.]?(\d*)\s*k?', True),
-            (r'\$?\s*(\d+)[,.]?(\d*)\s*k?\s*-\s*\$?\s*(\d+)[,.]?(\d*)\s*k?', True),
-        ]
+    def _parse_query(self, query: str, index: CatalogIndex) -> Dict[str, Any]:
+        """Parse a user query into its structured search intent"""
+        # "cheap"/"affordable" without a number means the cheapest 30% of the catalog
+        intent = parse_query(query, cheap_price=lambda: index.stats.price_quantile(0.3))
+        
+        # Misspelled models and vocabulary, and catalog models the parser has no pattern for
+        intent.update(index.terms.intent_matches(query, intent))
+        return intent
+    
+    def _intent_key(self, intent: Dict[str, Any], query: str, limit: int, version: str) -> tuple:
+        """
+        Cache key for a parsed intent
+        
+        Queries that parse to the same intent ("cheap SUV under 30k" and
+        "SUVs under $30,000 cheap") share a key. With semantic scoring on,
+        the words the semantic vector is built from are part of it too;
+        those ignore numbers, plurals and word order, so such queries still
+        share it. List order never affects scoring, so lists are sorted.
+        The catalog version keeps results from a request that started
+        before a reload from being served afterwards.
+        """
+        price_range = intent['price_range']
+        return (
+            version,
+            query_words(query) if self.semantic_weight else (),
+            tuple(float(p) for p in price_range) if price_range else None,
+            intent['year'],
+            tuple(sorted(intent['body_types'])),
+            tuple(sorted(intent['model_names'])),
+            tuple(sorted(intent['features'])),
+            tuple(sorted(intent['use_cases'])),
+            tuple(intent.get('fuzzy_models', ())),
+            tuple(intent.get('fuzzy_tags', ())),
+            limit,
+        )
+    
+    def _semantic_scores(self, index: CatalogIndex, query: str) -> Optional[np.ndarray]:
+        """Weighted semantic similarity of the query to each car, or None when disabled"""
+        if not self.semantic_weight:
+            return None
+        return self.semantic_weight * index.vectors.similarities(query)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size of the search result cache"""
+        return self.result_cache.stats()
+    
+    def _ranked_rows(
+        self, 
+        index: CatalogIndex, 
+        scores: np.ndarray, 
+        intent: Dict[str, Any], 
+        limit: int, 
+        user_query: str,
+        semantic: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Pick the best rows for one scored query
         
-        for pattern, is_range in range_patterns:
-            match = re.search(pattern, query_lower)
-            if match:
-                groups = match.groups()
-                min_str = (groups[0] or '') + (groups[1] or '')
-                max_str = (groups[2] or '') + (groups[3] or '')
-                
-                if min_str and max_str:
-                    min_val = int(min_str)
-                    max_val = int(max_str)
-                    
-                    if 'k' in match.group(0).lower() or min_val < 1000:
-                        min_val *= 1000
-                        max_val *= 1000
-                    
-                    return (min_val, max_val)
-        
-        # Single value patterns
-        single_patterns = [
-            r'under\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'below\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'less than\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'up to\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'\$?\s*(\d+)[,.]?(\d*)\s*k?\s*or less',
-            r'around\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'about\s*\$?\s*(\d+)[,.]?(\d*)\s*k?',
-            r'\$\s*(\d{1,3}),?(\d{3})',
-        ]
+        Args:
+            index: Catalog index the scores were computed against
+            scores: Relevance score of every catalog row
+            intent: Parsed query intent
+            limit: Maximum number of results to return
+            user_query: Original query, for logging
+            semantic: Optional semantic score of every catalog row, blended
+                into the ranking of the relevant rows
+            
+        Returns:
+            Row numbers, best first
+        """
+        # Select the best rows without sorting the whole catalog, dropping
+        # very low-scoring results
+        ranked = select_rows(scores, intent, limit, bonus=semantic)
         
-        for pattern in single_patterns:
-            match = re.search(pattern, query_lower)
-            if match:
-                groups = match.groups()
-                price_str = ''.join(g for g in groups if g)
-                
-                if price_str:
-                    price = int(price_str)
-                    match_text = match.group(0).lower()
-                    if 'k' in match_text or (price < 1000 and 'k' not in match_text and price < 100):
-                        price *= 1000
-                    
-                    return (0, price)
-        
-        return None
-    
-    def _extract_year(self, query: str) -> Optional[int]:
-        """Extract year from user query"""
-        year_pattern = r'\b(20\d{2})\b'
-        match = re.search(year_pattern, query)
-        if match:
-            year = int(match.group(1))
-            if 2000 <= year <= 2099:
-                return year
-        return None
+        # Ensure we have results
+        if len(ranked) == 0:
+            print(f"⚠️ No highly relevant matches found, using broader search")
+            ranked = top_k(fallback_scores(index), limit)
+        
+        # Final safety check
+        if len(ranked) == 0:
+            print(f"❌ ERROR: No results after processing! Query: '{user_query}'")
+            ranked = np.argsort(-index.year, kind='stable')[:limit]
+        
+        return ranked
     
-    def _extract_keywords(self, query: str) -> Dict[str, Any]:
-        """Extract keywords from user query"""
-        query_lower = query.lower()
-        keywords = {
-            'body_types': [],
-            'features': [],
-            'use_cases': [],
-            'model_names': [],
-            'year': None,
-        }
+    def search_cars(self, user_query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search through CSV data based on user requirements
         
-        # Extract year
-        keywords['year'] = self._extract_year(query)
+        Args:
+            user_query: User's query string
+            limit: Maximum number of results to return
+            
+        Returns:
+            List of matched car dictionaries
+        """
+        index = self.index
         
-        # Body type keywords
-        body_type_keywords = {
-            'sedan': ['sedan', 'car'],
-            'suv': ['suv', 'suvs', 'sport utility', 'sport-utility', 'sport utility vehicle', 'crossover', 'cross-over'],
-            'truck': ['truck', 'trucks', 'pickup', 'pick-up', 'pickup truck'],
-            'hatchback': ['hatchback', 'hatch-back', 'hatch'],
-            'sports car': ['sports car', 'sportscar', 'sporty car'],
-        }
+        # Extract price range and keywords in one pass over the query
+        keywords = self._parse_query(user_query, index)
         
-        for body_type, terms in body_type_keywords.items():
-            for term in terms:
-                pattern = r'\b' + re.escape(term) + r'\b'
-                if re.search(pattern, query_lower):
-                    model_names_after = ['rav4', 'corolla', 'camry', 'prius', 'yaris']
-                    term_pos = query_lower.find(term)
-                    if term_pos != -1:
-                        text_after = query_lower[term_pos + len(term):term_pos + len(term) + 5].strip()
-                        is_part_of_model = any(model in text_after for model in model_names_after)
-                        if not is_part_of_model:
-                            keywords['body_types'].append(body_type)
-                            break
-        
-        # Feature keywords
-        feature_keywords = {
-            'fuel efficient': ['fuel efficient', 'good gas mileage', 'mpg', 'economy', 'efficient'],
-            'hybrid': ['hybrid', 'electric', 'ev', 'plug-in'],
-            'awd': ['awd', 'all wheel drive', '4wd', 'four wheel drive'],
-            'spacious': ['spacious', 'roomy', 'large', 'big'],
-            'luxury': ['luxury', 'premium', 'high-end', 'nice'],
-            'family': ['family', 'kids', 'children', 'safe'],
-            'reliable': ['reliable', 'dependable', 'durable'],
-        }
+        # Repeated intents are served from the cache
+        cache_key = self._intent_key(keywords, user_query, limit, index.version)
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            print(f"🔍 Search query: '{user_query}' -> Found {len(cached)} cars (cached)")
+            return index.car_dicts(cached)
         
-        for feature, terms in feature_keywords.items():
-            if any(term in query_lower for term in terms):
-                keywords['features'].append(feature)
+        # Calculate relevance scores (the only per-query allocation)
+        scores = score_intent(index, keywords)
+        semantic = self._semantic_scores(index, user_query)
+        rows = self._ranked_rows(index, scores, keywords, limit, user_query, semantic)
         
-        # Use case keywords
-        use_case_keywords = {
-            'commuting': ['commute', 'daily', 'work', 'driving to work'],
-            'family': ['family', 'kids', 'children'],
-            'off-road': ['off-road', 'off road', 'camping', 'outdoor'],
-            'cargo': ['cargo', 'hauling', 'towing', 'luggage'],
-        }
+        # Only row numbers are cached; cars are built from the index
+        self.result_cache.set(cache_key, rows)
         
-        for use_case, terms in use_case_keywords.items():
-            if any(term in query_lower for term in terms):
-                keywords['use_cases'].append(use_case)
-        
-        # Model name detection
-        model_names = [
-            'Land Cruiser Amazon',
-            'Land Cruiser',
-            '4Runner',
-            'RAV4',
-            'C-HR',
-            'GT86',
-            'Camry', 'Corolla', 'Highlander', 'Tundra', 'Tacoma', 
-            'Prius', 'Avalon', 'Sequoia', 'Yaris', 'Supra', 
-            'AYGO', 'Venza', 'Sienna'
-        ]
+        print(f"🔍 Search query: '{user_query}' -> Found {len(rows)} cars")
+        return index.car_dicts(rows)
+    
+    def search_cars_batch(
+        self, 
+        queries: List[str], 
+        limit: int = 5, 
+        max_batch_cells: int = 1 << 24
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for many queries at once
         
-        matched_models = []
+        Queries are scored together as a queries x catalog matrix, in chunks
+        of at most `max_batch_cells` scores to bound memory. Results are the
+        same as calling search_cars for each query; queries that parse to
+        the same intent are only scored once and the result cache is used
+        and filled as usual.
         
-        for model in model_names:
-            is_covered = any(model in matched and len(model) < len(matched) for matched in matched_models)
-            if is_covered:
+        Args:
+            queries: User query strings
+            limit: Maximum number of results per query
+            max_batch_cells: Upper bound on the size of one score matrix
+            
+        Returns:
+            One list of matched car dictionaries per query, in input order
+        """
+        index = self.index
+        intents = [self._parse_query(query, index) for query in queries]
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        
+        # Group positions by intent; only intents missing from the cache are scored
+        pending: Dict[tuple, List[int]] = {}
+        for pos, intent in enumerate(intents):
+            key = self._intent_key(intent, queries[pos], limit, index.version)
+            if key in pending:
+                pending[key].append(pos)
                 continue
-                
-            if model == '4Runner':
-                pattern = r'\b4runner\b|\b4-runner\b'
-            elif model == 'RAV4':
-                pattern = r'\brav4\b|\brav\s*4\b'
-            elif model == 'Land Cruiser':
-                pattern = r'\bland\s+cruiser\b(?!\s+amazon)'
-            elif model == 'Land Cruiser Amazon':
-                pattern = r'\bland\s+cruiser\s+amazon\b'
-            elif model == 'C-HR':
-                pattern = r'\bc-hr\b|\bchr\b'
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                results[pos] = index.car_dicts(cached)
             else:
-                pattern = r'\b' + re.escape(model.lower()) + r'\b'
-            
-            if re.search(pattern, query_lower, re.IGNORECASE):
-                matched_models = [m for m in matched_models if m not in model or len(m) >= len(model)]
-                if model not in matched_models:
-                    matched_models.append(model)
+                pending[key] = [pos]
+        
+        keys = list(pending)
+        chunk_size = max(1, max_batch_cells // max(len(index), 1))
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            chunk_intents = [intents[pending[key][0]] for key in chunk]
+            scores = score_intents(index, chunk_intents)
+            for key, intent, row_scores in zip(chunk, chunk_intents, scores):
+                positions = pending[key]
+                query = queries[positions[0]]
+                semantic = self._semantic_scores(index, query)
+                rows = self._ranked_rows(index, row_scores, intent, limit, query, semantic)
+                self.result_cache.set(key, rows)
+                for pos in positions:
+                    results[pos] = index.car_dicts(rows)
+        
+        print(f"🔍 Batch search: {len(queries)} queries -> {len(keys)} scored, {len(queries) - sum(len(p) for p in pending.values())} cached")
+        return results
+    
+    def _session_search(
+        self, 
+        index: CatalogIndex, 
+        intent: Dict[str, Any], 
+        filters: Dict[str, Any], 
+        query: str, 
+        limit: int
+    ) -> tuple:
+        """
+        Full search for a chat turn, keeping enough candidates to refine later
         
-        keywords['model_names'] = matched_models
+        Without filters the first `limit` rows are exactly what search_cars
+        returns for the same query.
         
-        return keywords
+        Returns:
+            (candidate rows, their ranking scores, rows to show)
+        """
+        scores = score_intent(index, intent)
+        semantic = self._semantic_scores(index, query)
+        candidates = np.flatnonzero(filter_mask(index, np.arange(len(index)), filters)) if filters else np.arange(len(index))
+        scores = scores[candidates]
+        if semantic is not None:
+            semantic = semantic[candidates]
+        
+        order = select_rows(scores, intent, self.session_candidates, bonus=semantic)
+        if len(order) > 0:
+            ranking = scores[order] if semantic is None else scores[order] + semantic[order]
+        elif len(candidates) > 0:
+            print(f"⚠️ No highly relevant matches found, using broader search")
+            broad = fallback_scores(index)[candidates]
+            order = top_k(broad, self.session_candidates)
+            ranking = broad[order]
+        else:
+            ranking = np.empty(0)
+        
+        rows = candidates[order]
+        return rows, ranking, rows[:limit]
     
-    def search_cars(self, user_query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def chat_search(
+        self, 
+        message: str, 
+        conversation_history: Optional[List[Dict]] = None, 
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
         """
-        Search through CSV data based on user requirements
+        Search for one chat turn, refining the previous turn where possible
+        
+        See chat_search_rows.
+        
+        Returns:
+            List of matched car dictionaries
+        """
+        index, rows = self.chat_search_rows(message, conversation_history, limit)
+        return index.car_dicts(rows)
+    
+    def chat_search_rows(
+        self, 
+        message: str, 
+        conversation_history: Optional[List[Dict]] = None, 
+        limit: int = 5
+    ) -> tuple:
+        """
+        Search for one chat turn, refining the previous turn where possible
+        
+        The first message of a conversation (or any message that is not a
+        follow-up) is searched like search_cars. Follow-ups such as
+        "cheaper", "only 2020 or newer" or "what about hybrids?" narrow and
+        re-weight the previous turn's candidates instead of rescoring the
+        catalog. The catalog is only rescored when the search widens, or
+        when fewer than `limit` candidates pass the follow-up's filters
+        (matches outside the previous turn's candidates may remain).
         
         Args:
-            user_query: User's query string
+            message: User's current message
+            conversation_history: Earlier messages as {role, content} dicts
             limit: Maximum number of results to return
             
         Returns:
-            List of matched car dictionaries
+            (CatalogIndex searched, matched row numbers best first); the
+            index serializes the rows with car_dicts or car_fragments
         """
-        working_df = self.df.copy()
-        
-        # Extract price range
-        price_range = self._extract_price_range(user_query)
-        
-        # Extract keywords
-        keywords = self._extract_keywords(user_query)
-        
-        # Add body_type column for all cars
-        working_df['body_type'] = working_df['Genmodel'].apply(self._infer_body_type)
-        
-        # Calculate relevance scores
-        working_df['relevance_score'] = 0
-        
-        # Base score: prefer newer models
-        if len(working_df) > 0:
-            max_year = working_df['Year'].max()
-            min_year = working_df['Year'].min()
-            if max_year > min_year:
-                recent_cars = working_df['Year'] >= (max_year - 5)
-                working_df.loc[recent_cars, 'relevance_score'] += 15
-                older_cars = working_df['Year'] < (max_year - 5)
-                working_df.loc[older_cars, 'relevance_score'] += ((working_df.loc[older_cars, 'Year'] - min_year) / (max_year - min_year)) * 8
-        
-        # Base score: prefer lower mileage
-        if 'mileage' in working_df.columns and len(working_df) > 0:
-            low_mileage = working_df['mileage'] <= 100000
-            medium_mileage = (working_df['mileage'] > 100000) & (working_df['mileage'] <= 200000)
-            high_mileage = working_df['mileage'] > 200000
-            
-            working_df.loc[low_mileage, 'relevance_score'] += 15
-            working_df.loc[medium_mileage, 'relevance_score'] += 5
-            working_df.loc[high_mileage, 'relevance_score'] -= 5
-        
-        # Price filtering
-        if price_range:
-            min_price, max_price = price_range
-            in_range = (working_df['Entry_price'] >= min_price) & (working_df['Entry_price'] <= max_price)
-            working_df.loc[in_range, 'relevance_score'] += 60
-            slightly_over = (working_df['Entry_price'] > max_price) & (working_df['Entry_price'] <= max_price * 1.2)
-            slightly_under = (working_df['Entry_price'] < min_price) & (working_df['Entry_price'] >= min_price * 0.8)
-            working_df.loc[slightly_over | slightly_under, 'relevance_score'] -= 10
-            far_out_of_range = (working_df['Entry_price'] > max_price * 1.2) | (working_df['Entry_price'] < min_price * 0.8)
-            working_df.loc[far_out_of_range, 'relevance_score'] -= 40
+        index = self.index
+        user_messages = [
+            m.get('content') or '' for m in (conversation_history or []) 
+            if m.get('role') == 'user'
+        ]
+        # Tolerate clients that already appended the current message
+        if user_messages and user_messages[-1].strip() == message.strip():
+            user_messages = user_messages[:-1]
+        
+        follow_up = self._parse_query(message, index)
+        session = self.sessions.get(session_key(user_messages)) if user_messages else None
+        plan = None
+        if session is not None and session.version == index.version:
+            plan = plan_follow_up(session, message, follow_up, index)
+        
+        if plan is None:
+            query, intent, filters = message, follow_up, {}
+            rows, scores, shown = self._session_search(index, intent, filters, query, limit)
+            print(f"💬 Chat search: '{message}' -> Found {len(shown)} cars")
         else:
-            median_price = working_df['Entry_price'].median()
-            price_diff = abs(working_df['Entry_price'] - median_price)
-            max_diff = price_diff.max()
-            if max_diff > 0:
-                within_reasonable_range = price_diff <= (median_price * 0.5)
-                working_df.loc[within_reasonable_range, 'relevance_score'] += 8
-                working_df.loc[~within_reasonable_range, 'relevance_score'] -= 5
-        
-        # Year and body type matching
-        year_specified = keywords.get('year') is not None
-        body_type_specified = len(keywords['body_types']) > 0
-        
-        if year_specified:
-            target_year = keywords['year']
-            year_exact_match = working_df['Year'] == target_year
-            year_close_match = (abs(working_df['Year'] - target_year) <= 2) & ~year_exact_match
-            year_far = abs(working_df['Year'] - target_year) > 2
-            
-            if body_type_specified:
-                body_match = working_df['body_type'].isin(keywords['body_types'])
-                perfect_match = year_exact_match & body_match
-                working_df.loc[perfect_match, 'relevance_score'] += 100
-                good_match = year_close_match & body_match
-                working_df.loc[good_match, 'relevance_score'] += 60
-                wrong_body_right_year = year_exact_match & ~body_match
-                working_df.loc[wrong_body_right_year, 'relevance_score'] += 10
-                right_body_wrong_year = body_match & year_far
-                working_df.loc[right_body_wrong_year, 'relevance_score'] += 30
-                wrong_body = ~body_match
-                working_df.loc[wrong_body, 'relevance_score'] -= 40
+            query, intent, filters = f"{session.query} {message}", plan['intent'], plan['filters']
+            mask = filter_mask(index, session.rows, filters) if not plan['widen'] else None
+            if mask is not None and np.count_nonzero(mask) >= limit:
+                scores = reweighted_scores(index, session, intent, mask)
+                order = top_k(scores, len(scores))
+                rows, scores = session.rows[mask][order], scores[order]
+                shown = rows[:limit]
+                print(f"💬 Follow-up: '{message}' -> narrowed {len(session.rows)} to {len(rows)} candidates, {len(shown)} cars")
             else:
-                working_df.loc[year_exact_match, 'relevance_score'] += 50
-                working_df.loc[year_close_match, 'relevance_score'] += 25
-                working_df.loc[year_far, 'relevance_score'] -= 20
-        
-        # Body type matching
-        if keywords['body_types'] and not year_specified:
-            body_match = working_df['body_type'].isin(keywords['body_types'])
-            working_df.loc[body_match, 'relevance_score'] += 50
-            body_mismatch = ~body_match
-            working_df.loc[body_mismatch, 'relevance_score'] -= 50
-        elif not keywords['body_types'] and not year_specified and not price_range:
-            popular_types = ['SUV', 'Sedan']
-            body_match = working_df['body_type'].isin(popular_types)
-            working_df.loc[body_match, 'relevance_score'] += 3
-        
-        # Model name matching
-        if keywords['model_names']:
-            for model in keywords['model_names']:
-                exact_match = working_df['Genmodel'].str.lower() == model.lower()
-                partial_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False) & ~exact_match
-                working_df.loc[exact_match, 'relevance_score'] += 80
-                working_df.loc[partial_match, 'relevance_score'] += 50
-        
-        # Feature-based boosts
-        if any('hybrid' in f.lower() or 'electric' in f.lower() or 'ev' in f.lower() for f in keywords['features']):
-            hybrid_models = ['Prius', 'RAV4', 'Highlander', 'Camry', 'Avalon', 'Venza']
-            for model in hybrid_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 25
-        
-        if any('fuel efficient' in f.lower() or 'economy' in f.lower() or 'mpg' in f.lower() or 'gas mileage' in f.lower() for f in keywords['features']):
-            efficient_models = ['Prius', 'Corolla', 'Camry', 'Yaris', 'AYGO']
-            for model in efficient_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 20
-            large_vehicles = working_df['body_type'].isin(['SUV', 'Truck'])
-            working_df.loc[large_vehicles, 'relevance_score'] -= 15
-        
-        if any('family' in f.lower() or 'kids' in f.lower() or 'children' in f.lower() for f in keywords['features'] + keywords['use_cases']):
-            family_models = ['Highlander', 'Sienna', 'RAV4', '4Runner', 'Sequoia', 'Venza']
-            for model in family_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 25
-            suv_match = working_df['body_type'] == 'SUV'
-            working_df.loc[suv_match, 'relevance_score'] += 15
-        
-        if any('spacious' in f.lower() or 'roomy' in f.lower() or 'large' in f.lower() or 'big' in f.lower() for f in keywords['features']):
-            spacious_models = ['Highlander', 'Sequoia', 'Land Cruiser', '4Runner', 'Sienna']
-            for model in spacious_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 20
-            small_cars = working_df['body_type'].isin(['Hatchback', 'Sedan'])
-            small_models = working_df['Genmodel'].str.contains('Yaris|AYGO|iQ|Corolla', case=False, na=False, regex=True)
-            working_df.loc[small_cars | small_models, 'relevance_score'] -= 20
-        
-        if any('truck' in bt.lower() or 'pickup' in bt.lower() or 'pick-up' in bt.lower() for bt in keywords['body_types'] + keywords['use_cases']):
-            truck_models = ['Tundra', 'Tacoma']
-            for model in truck_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 30
-            non_trucks = working_df['body_type'] != 'Truck'
-            working_df.loc[non_trucks, 'relevance_score'] -= 30
-        
-        # Use case boosts
-        if 'commuting' in keywords['use_cases']:
-            commute_models = ['Corolla', 'Camry', 'Prius', 'Yaris', 'AYGO']
-            for model in commute_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 18
-            commute_friendly = working_df['body_type'].isin(['Sedan', 'Hatchback'])
-            working_df.loc[commute_friendly, 'relevance_score'] += 10
-        
-        if 'off-road' in keywords['use_cases']:
-            offroad_models = ['4Runner', 'Land Cruiser', 'Tacoma', 'Tundra']
-            for model in offroad_models:
-                model_match = working_df['Genmodel'].str.contains(model, case=False, na=False, regex=False)
-                working_df.loc[model_match, 'relevance_score'] += 25
-            offroad_friendly = working_df['body_type'].isin(['SUV', 'Truck'])
-            working_df.loc[offroad_friendly, 'relevance_score'] += 15
-        
-        # Sort by relevance score
-        working_df = working_df.sort_values('relevance_score', ascending=False)
-        
-        # Filter out very low-scoring results
-        if len(working_df) > 0:
-            max_score = working_df['relevance_score'].max()
-            min_acceptable_score = max_score * 0.3
-            
-            has_specific_criteria = year_specified or body_type_specified or price_range or keywords['model_names']
-            if has_specific_criteria:
-                min_acceptable_score = max_score * 0.4
-                working_df = working_df[working_df['relevance_score'] >= min_acceptable_score]
-            
-            if len(working_df) > limit * 2:
-                working_df = working_df.head(limit * 2)
-        
-        # Ensure we have results
-        if len(working_df) == 0:
-            print(f"⚠️ No highly relevant matches found, using broader search")
-            working_df = self.df.copy()
-            working_df['body_type'] = working_df['Genmodel'].apply(self._infer_body_type)
-            working_df['relevance_score'] = 0
-            max_year = working_df['Year'].max()
-            min_year = working_df['Year'].min()
-            if max_year > min_year:
-                working_df['relevance_score'] += ((working_df['Year'] - min_year) / (max_year - min_year)) * 20
-            working_df = working_df.sort_values('relevance_score', ascending=False)
-        
-        # Limit results
-        results_df = working_df.head(limit)
+                rows, scores, shown = self._session_search(index, intent, filters, query, limit)
+                print(f"💬 Follow-up: '{message}' -> widened search, {len(shown)} cars")
+        
+        self.sessions.set(
+            session_key(user_messages + [message]),
+            ChatSession(index.version, query, intent, filters, rows, scores, shown)
+        )
+        return index, shown
+    
+    def facet_counts(
+        self, 
+        message: Optional[str] = None, 
+        selections: Optional[Dict[str, List[Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Live facet counts (price buckets, years, body types, models, mileage
+        bands) for the current filters
         
-        # Final safety check
-        if len(results_df) == 0:
-            print(f"❌ ERROR: No results after processing! Query: '{user_query}'")
-            results_df = self.df.copy()
-            results_df = results_df.sort_values('Year', ascending=False).head(limit)
-        
-        # Convert to list of dictionaries
-        results = []
-        for _, row in results_df.iterrows():
-            car_dict = {
-                'model': row['Genmodel'],
-                'year': int(row['Year']) if pd.notna(row['Year']) else None,
-                'price': float(row['Entry_price']) if pd.notna(row['Entry_price']) else None,
-                'mileage': int(row['mileage']) if pd.notna(row['mileage']) else None,
-                'image_url': row.get('Image_url', ''),
-                'body_type': self._infer_body_type(row['Genmodel']),
-                'maker': row.get('Maker', 'Toyota'),
-            }
-            results.append(car_dict)
-        
-        print(f"🔍 Search query: '{user_query}' -> Found {len(results)} cars")
-        return results
+        Args:
+            message: Optional chat message; its parsed intent selects facet
+                values (e.g. "SUV under 30k" selects SUVs priced up to
+                $30,000, see FacetIndex.intent_selections)
+            selections: Explicitly selected values per facet; a facet given
+                here replaces what the message implied for it
+            
+        Returns:
+            Dictionary with total, facets (see FacetIndex.counts), the
+            applied selections and the catalog version
+        """
+        index = self.index
+        applied = index.facets.intent_selections(self._parse_query(message, index)) if message else {}
+        applied.update({facet: list(values) for facet, values in (selections or {}).items() if values})
+        if applied.get('price'):
+            # Explicit price buckets replace the message's price range
+            applied.pop(PRICE_RANGE, None)
+        
+        result = index.facets.counts(applied)
+        result['selected'] = applied
+        result['version'] = index.version
+        return result
     
     def generate_recommendations(
         self, 
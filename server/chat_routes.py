@@ -0,0 +1,165 @@
+from flask import Response, jsonify, request, stream_with_context
+import json
+import os
+import threading
+
+from chat_rag import ToyotaCarRAG
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'Toyota_price_table.csv')
+
+# Maximum number of cars a client may ask for in one chat response
+MAX_CHAT_RESULTS = 20
+
+# One search engine per process, created on the first chat request. It
+# keeps the parsed catalog, indexes and result cache between requests and
+# hot-reloads the CSV itself, so it never needs to be rebuilt.
+_chat_engine = None
+_chat_engine_lock = threading.Lock()
+
+
+def get_chat_engine():
+    """
+    Return the process-wide ToyotaCarRAG, creating it on first use.
+    Safe to call from concurrent request threads; only one engine is built.
+    """
+    global _chat_engine
+    if _chat_engine is None:
+        with _chat_engine_lock:
+            if _chat_engine is None:
+                _chat_engine = ToyotaCarRAG(CSV_PATH)
+    return _chat_engine
+
+
+def _stream_format():
+    """
+    Streaming format requested by the client: 'ndjson', 'sse' or None for
+    a plain JSON response. Chosen with ?stream=ndjson|sse|1 or the Accept header.
+    """
+    stream = request.args.get('stream', '').lower()
+    if stream in ('sse', 'event-stream'):
+        return 'sse'
+    if stream in ('1', 'true', 'ndjson'):
+        return 'ndjson'
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+def _stream_events(car_fragments, response_text, stream_format):
+    """
+    Yield one event per car, built around its pre-serialized JSON, then a
+    final 'done' event carrying the same fields as the JSON response.
+    """
+    def encode(event, data):
+        if stream_format == 'sse':
+            return b'event: ' + event + b'\ndata: ' + data + b'\n\n'
+        return data + b'\n'
+
+    for i, fragment in enumerate(car_fragments):
+        yield encode(b'car', b'{"type": "car", "index": %d, "car": ' % i + fragment + b'}')
+    yield encode(b'done', json.dumps({
+        'type': 'done',
+        'success': True,
+        'response': response_text,
+        'count': len(car_fragments),
+    }).encode())
+
+
+def _json_response(cars_json, response_text):
+    """
+    The JSON chat response with the cars spliced in as pre-serialized JSON;
+    the same document jsonify would produce for the equivalent dictionary
+    """
+    body = b''.join([
+        b'{"matched_cars":', cars_json,
+        b',"response":', json.dumps(response_text, separators=(',', ':')).encode(),
+        b',"success":true}\n',
+    ])
+    return Response(body, status=200, mimetype='application/json')
+
+
+def register_chat_routes(app):
+    """
+    Register chat recommendation routes with the Flask app.
+    Uses the shared ToyotaCarRAG engine to search the Toyota catalog.
+    """
+
+    @app.route('/api/chat-recommendations', methods=['POST'])
+    def chat_recommendations():
+        """
+        Get car recommendations for a chat message.
+
+        Request body:
+            message: The user's chat message
+            conversation_history: Optional list of {role, content} messages
+            limit: Optional maximum number of cars (default 5)
+
+        Streaming:
+            With ?stream=ndjson (or Accept: application/x-ndjson) the response
+            is newline-delimited JSON; with ?stream=sse (or Accept:
+            text/event-stream) it is server-sent events. Either way there is
+            one 'car' event per matched car followed by a 'done' event.
+
+        Returns:
+            JSON response with success, response text and matched_cars
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            message = (data.get('message') or '').strip()
+
+            if not message:
+                return jsonify({
+                    'success': False,
+                    'error': 'Missing message',
+                    'message': 'Request body must contain a non-empty message'
+                }), 400
+
+            try:
+                limit = int(data.get('limit', 5))
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid limit',
+                    'message': 'limit must be an integer'
+                }), 400
+            limit = max(1, min(limit, MAX_CHAT_RESULTS))
+
+            conversation_history = data.get('conversation_history') or []
+
+            rag = get_chat_engine()
+            # Follow-ups ("cheaper", "what about hybrids?") refine the previous turn
+            index, rows = rag.chat_search_rows(message, conversation_history, limit=limit)
+            response_text = rag.generate_recommendations(message, index.car_dicts(rows), conversation_history)
+
+            # Cars are emitted from the catalog's pre-serialized row JSON
+            stream_format = _stream_format()
+            if stream_format is not None:
+                mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+                return Response(
+                    stream_with_context(_stream_events(index.car_fragments(rows), response_text, stream_format)),
+                    mimetype=mimetype,
+                    headers={
+                        'Cache-Control': 'no-cache',
+                        # Stop reverse proxies from buffering the stream
+                        'X-Accel-Buffering': 'no',
+                    }
+                )
+
+            return _json_response(index.cars_json(rows), response_text)
+
+        except FileNotFoundError:
+            return jsonify({
+                'success': False,
+                'error': 'File not found',
+                'message': 'Toyota_price_table.csv not found'
+            }), 500
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': 'Server error',
+                'message': f'An unexpected error occurred: {str(e)}'
+            }), 500
@@ -0,0 +1,222 @@
+"""
+Server-side chat sessions for multi-turn car search.
+
+A session remembers the merged intent of the conversation so far and the
+candidate rows (with their ranking scores) of the last full search.
+Follow-up messages such as "cheaper", "only 2020 or newer" or "what about
+hybrids?" are turned into a plan that either narrows and re-weights those
+candidates, or, when the search has to widen (a new model, a higher price
+cap), asks for a full rescore with the merged intent.
+
+Sessions are keyed by the user messages of the conversation, so the
+client only has to send its conversation history.
+"""
+
+import hashlib
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from search_scoring import intent_tag_weights
+
+# Messages that refer back to the previous results
+FOLLOW_UP_RE = re.compile(
+    r'^\s*(?:and|but|what about|how about|only|just|any|show me|same)\b'
+    r'|\b(?:instead|only|just|too|also|ones?|those|these)\b'
+)
+CHEAPER_RE = re.compile(r'\b(?:cheaper|less expensive|lower price[sd]?|more affordable)\b')
+PRICIER_RE = re.compile(r'\b(?:more expensive|pricier|higher end|bigger budget)\b')
+NEWER_RE = re.compile(r'\b(?:newer|more recent)\b')
+# "2020 or newer", "2018+", "2019 and up" (inclusive); "newer than 2018", "after 2018" (exclusive)
+MIN_YEAR_RE = re.compile(
+    r'\b(?P<inclusive>(?:19|20)\d{2})\s*(?:\+|or (?:newer|later|above)|and (?:newer|later|up|above))'
+    r'|\b(?:since|from)\s+(?P<since>(?:19|20)\d{2})\b'
+    r'|\b(?:newer than|after)\s+(?P<exclusive>(?:19|20)\d{2})\b'
+)
+ONLY_RE = re.compile(r'\b(?:only|just)\b')
+
+# Intent fields that add tag weights without narrowing the search
+REWEIGHT_FIELDS = ('features', 'use_cases')
+
+
+def session_key(user_messages: List[str]) -> str:
+    """Key of the session reached after these user messages"""
+    normalized = '\x1f'.join(' '.join(message.lower().split()) for message in user_messages)
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+class ChatSession:
+    """
+    State kept between chat turns.
+
+    `rows` and `scores` are the candidate row numbers of the last full
+    search, best first, with their ranking scores. `shown` is the subset
+    last returned to the user. `filters` holds hard limits added by
+    follow-ups: max_price, min_price, min_year and body_types.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        query: str,
+        intent: Dict[str, Any],
+        filters: Dict[str, Any],
+        rows: np.ndarray,
+        scores: np.ndarray,
+        shown: np.ndarray,
+    ):
+        self.version = version
+        self.query = query
+        self.intent = intent
+        self.filters = filters
+        self.rows = rows
+        self.scores = scores
+        self.shown = shown
+
+
+def merge_intents(previous: Dict[str, Any], follow_up: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Intent of the conversation after a follow-up
+
+    Scalar fields (price range, year) and the model list are replaced when
+    the follow-up sets them; feature-like lists are unioned.
+    """
+    merged = dict(previous)
+    for field in ('price_range', 'year'):
+        if follow_up.get(field):
+            merged[field] = follow_up[field]
+    for field in ('model_names', 'fuzzy_models', 'body_types'):
+        if follow_up.get(field):
+            merged[field] = list(follow_up[field])
+    for field in REWEIGHT_FIELDS:
+        merged[field] = sorted(set(previous.get(field, [])) | set(follow_up.get(field, [])))
+    merged['fuzzy_tags'] = sorted(dict(list(previous.get('fuzzy_tags', [])) + list(follow_up.get('fuzzy_tags', []))).items())
+    return merged
+
+
+def plan_follow_up(session: ChatSession, message: str, follow_up: Dict[str, Any], index) -> Optional[Dict[str, Any]]:
+    """
+    Work out how a follow-up message changes the search
+
+    Args:
+        session: Session of the conversation so far
+        message: The follow-up message
+        follow_up: Intent parsed from the message alone
+        index: CatalogIndex the session's rows refer to
+
+    Returns:
+        None when the message is a new, unrelated search. Otherwise a dict
+        with 'intent' (merged), 'filters' (merged) and 'widen', which is
+        True when the candidate set cannot answer the follow-up and the
+        whole catalog has to be rescored.
+    """
+    text = message.lower()
+    min_year_match = MIN_YEAR_RE.search(text)
+    cheaper = CHEAPER_RE.search(text)
+    pricier = PRICIER_RE.search(text)
+    newer = NEWER_RE.search(text)
+    has_new_tags = any(set(follow_up.get(f, [])) - set(session.intent.get(f, [])) for f in REWEIGHT_FIELDS)
+    has_new_tags = has_new_tags or bool(follow_up.get('fuzzy_tags'))
+
+    is_follow_up = bool(FOLLOW_UP_RE.search(text) or min_year_match or cheaper or pricier or newer)
+    # A bare "hybrids?" only makes sense relative to the previous results
+    standalone = follow_up['model_names'] or follow_up.get('fuzzy_models') or follow_up['body_types'] \
+        or follow_up['price_range'] or follow_up['year'] is not None
+    if not is_follow_up and (standalone or not has_new_tags):
+        return None
+
+    filters = dict(session.filters)
+    widen = False
+    shown_prices = index.price[session.shown] if len(session.shown) else index.price[session.rows]
+    shown_years = index.year[session.shown] if len(session.shown) else index.year[session.rows]
+
+    # Price: cheaper than what was shown narrows; a higher cap widens
+    if cheaper and len(shown_prices):
+        filters['max_price'] = min(filters.get('max_price', np.inf), float(shown_prices.mean()))
+    if follow_up['price_range']:
+        min_price, max_price = follow_up['price_range']
+        old_max = session.intent['price_range'][1] if session.intent['price_range'] else filters.get('max_price')
+        if old_max is not None and max_price > old_max:
+            widen = True
+            filters.pop('max_price', None)
+        filters['max_price'] = min(filters.get('max_price', np.inf), max_price)
+        if min_price:
+            filters['min_price'] = max(filters.get('min_price', 0), min_price)
+    clear_price = False
+    if pricier:
+        widen = True
+        clear_price = not follow_up['price_range']
+        filters.pop('max_price', None)
+        if len(shown_prices):
+            filters['min_price'] = float(shown_prices.mean())
+
+    # Year: lower bounds narrow, a specific other year widens
+    follow_intent = dict(follow_up)
+    if min_year_match:
+        if min_year_match.group('inclusive') or min_year_match.group('since'):
+            min_year = int(min_year_match.group('inclusive') or min_year_match.group('since'))
+        else:
+            min_year = int(min_year_match.group('exclusive')) + 1
+        filters['min_year'] = max(filters.get('min_year', 0), min_year)
+        # The year is a bound, not a target to score against
+        follow_intent['year'] = None
+    elif newer and len(shown_years):
+        filters['min_year'] = max(filters.get('min_year', 0), int(shown_years.min()) + 1)
+    elif follow_up['year'] is not None and follow_up['year'] != session.intent['year']:
+        widen = True
+
+    # Body types: "only SUVs" narrows, "what about trucks" widens
+    if follow_up['body_types']:
+        if ONLY_RE.search(text):
+            filters['body_types'] = sorted(follow_up['body_types'])
+        elif set(follow_up['body_types']) != set(session.intent['body_types']):
+            widen = True
+
+    # A different model always needs the whole catalog
+    previous_models = {m.lower() for m in session.intent['model_names']}
+    previous_models |= {m.lower() for m, _ in session.intent.get('fuzzy_models', [])}
+    follow_models = {m.lower() for m in follow_up['model_names']}
+    follow_models |= {m.lower() for m, _ in follow_up.get('fuzzy_models', [])}
+    if follow_models - previous_models:
+        widen = True
+
+    intent = merge_intents(session.intent, follow_intent)
+    if clear_price:
+        # The old price range would keep scoring pricier cars down
+        intent['price_range'] = None
+    return {
+        'intent': intent,
+        'filters': filters,
+        'widen': widen,
+    }
+
+
+def filter_mask(index, rows: np.ndarray, filters: Dict[str, Any]) -> np.ndarray:
+    """Which of `rows` pass the session's hard filters"""
+    mask = np.ones(len(rows), dtype=bool)
+    if 'max_price' in filters:
+        mask &= index.price[rows] <= filters['max_price']
+    if 'min_price' in filters:
+        mask &= index.price[rows] >= filters['min_price']
+    if 'min_year' in filters:
+        mask &= index.year[rows] >= filters['min_year']
+    if 'body_types' in filters:
+        wanted = {body_type.lower() for body_type in filters['body_types']}
+        matches = np.array([body_type.lower() in wanted for body_type in index.model_body_types], dtype=bool)
+        mask &= matches[index.model_codes[rows]]
+    return mask
+
+
+def reweighted_scores(index, session: ChatSession, intent: Dict[str, Any], rows_mask: np.ndarray) -> np.ndarray:
+    """
+    Ranking scores of the session's remaining candidates under the merged
+    intent: the stored scores plus the change in feature and use-case
+    tag weights, computed for the candidate rows only
+    """
+    rows = session.rows[rows_mask]
+    delta = intent_tag_weights(intent, index.tag_columns) - intent_tag_weights(session.intent, index.tag_columns)
+    scores = session.scores[rows_mask]
+    if delta.any():
+        scores = scores + (index.model_tags @ delta)[index.model_codes[rows]]
+    return scores
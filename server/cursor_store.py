@@ -0,0 +1,273 @@
+"""
+Cursor positions for left/right recommendation navigation.
+
+Each user has one position per side ('left' walks the even indices of
+their sorted recommendations, 'right' the odd ones). A cursor store keeps
+those positions with atomic read-modify-write updates, so concurrent
+requests from the same user cannot lose a step.
+
+Two backends share one interface:
+
+- MemoryCursorStore: in-process, lock-protected and LRU-bounded. Fine for
+  a single worker.
+- SQLiteCursorStore: a SQLite database in WAL mode that every worker
+  process on the host opens, so cursors stay put whichever worker serves
+  the request.
+
+create_cursor_store() picks one from the CURSOR_STORE environment
+variable ('memory', the default, or 'sqlite').
+"""
+
+import abc
+import contextlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Position of each side before the user has navigated
+DEFAULT_POSITIONS = {'left': 0, 'right': 1}
+
+# Default database for the shared backend, next to this file
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cursors.sqlite3')
+
+
+def _check_side(side: str):
+    if side not in DEFAULT_POSITIONS:
+        raise ValueError(f"Unknown side {side!r}; expected 'left' or 'right'")
+
+
+def _clamped(delta: int, minimum: Optional[int], maximum: Optional[int]) -> Callable[[int], int]:
+    def step(current: int) -> int:
+        position = current + delta
+        if maximum is not None and position > maximum:
+            position = maximum
+        if minimum is not None and position < minimum:
+            position = minimum
+        return position
+    return step
+
+
+class CursorStore(abc.ABC):
+    """
+    Interface shared by the backends.
+
+    Subclasses implement get, update and reset; increment, decrement and
+    set are built on the atomic update.
+    """
+
+    @abc.abstractmethod
+    def get(self, uid: str, side: str) -> int:
+        """Current position of a side, or its default"""
+
+    @abc.abstractmethod
+    def update(self, uid: str, side: str, func: Callable[[int], Optional[int]]) -> Tuple[int, Optional[int]]:
+        """
+        Atomically replace a position with func(current)
+
+        Args:
+            uid: The user's unique identifier
+            side: 'left' or 'right'
+            func: Maps the current position to the new one, or to None to
+                leave it unchanged
+
+        Returns:
+            (previous position, new position or None)
+        """
+
+    @abc.abstractmethod
+    def reset(self, uid: str):
+        """Put both of a user's cursors back to their defaults"""
+
+    def set(self, uid: str, side: str, position: int):
+        """Set a position"""
+        self.update(uid, side, lambda current: position)
+
+    def increment(self, uid: str, side: str, delta: int = 2, maximum: Optional[int] = None) -> int:
+        """Atomically add `delta`, capped at `maximum`; returns the new position"""
+        return self.update(uid, side, _clamped(delta, None, maximum))[1]
+
+    def decrement(self, uid: str, side: str, delta: int = 2, minimum: Optional[int] = None) -> int:
+        """Atomically subtract `delta`, floored at `minimum`; returns the new position"""
+        return self.update(uid, side, _clamped(-delta, minimum, None))[1]
+
+
+class MemoryCursorStore(CursorStore):
+    """
+    Cursors kept in this process, least recently used users evicted first
+    once more than `maxsize` users have cursors.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._positions: 'OrderedDict[str, Dict[str, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, uid: str) -> Dict[str, int]:
+        # Caller holds the lock
+        entry = self._positions.get(uid)
+        if entry is None:
+            entry = dict(DEFAULT_POSITIONS)
+            self._positions[uid] = entry
+            while len(self._positions) > self.maxsize:
+                self._positions.popitem(last=False)
+        else:
+            self._positions.move_to_end(uid)
+        return entry
+
+    def get(self, uid: str, side: str) -> int:
+        _check_side(side)
+        with self._lock:
+            entry = self._positions.get(uid)
+            if entry is None:
+                return DEFAULT_POSITIONS[side]
+            self._positions.move_to_end(uid)
+            return entry[side]
+
+    def update(self, uid: str, side: str, func: Callable[[int], Optional[int]]) -> Tuple[int, Optional[int]]:
+        _check_side(side)
+        with self._lock:
+            entry = self._entry(uid)
+            current = entry[side]
+            position = func(current)
+            if position is not None:
+                entry[side] = position
+            return current, position
+
+    def reset(self, uid: str):
+        with self._lock:
+            self._positions[uid] = dict(DEFAULT_POSITIONS)
+            self._positions.move_to_end(uid)
+            while len(self._positions) > self.maxsize:
+                self._positions.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+class SQLiteDatabase:
+    """
+    A SQLite database file shared by every worker process on a host, in WAL
+    mode so reads never wait for writers. Connections are per thread.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections are not shared between threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction holding the database's write lock from the start"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+
+class SQLiteCursorStore(CursorStore):
+    """
+    Cursors in a SQLite database shared by every worker process on a host.
+
+    The database runs in WAL mode so reads never wait for writers. Each
+    update is one BEGIN IMMEDIATE transaction, which takes the write lock
+    before reading, so read-modify-write is atomic across processes. Every
+    `prune_every` writes, users beyond the `maxsize` most recently active
+    are deleted.
+    """
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, maxsize: int = 100000, prune_every: int = 1000, timeout: float = 5.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.prune_every = prune_every
+        self.timeout = timeout
+        self._db = SQLiteDatabase(path, timeout)
+        # Counts writes for pruning; next() on a count is atomic under the GIL
+        self._writes = itertools.count(1)
+        with self._db.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cursors ('
+                ' uid TEXT NOT NULL, side TEXT NOT NULL, position INTEGER NOT NULL, updated REAL NOT NULL,'
+                ' PRIMARY KEY (uid, side))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cursors_updated ON cursors (updated)')
+
+    def _write(self, conn: sqlite3.Connection, uid: str, side: str, position: int):
+        conn.execute(
+            'INSERT INTO cursors (uid, side, position, updated) VALUES (?, ?, ?, ?)'
+            ' ON CONFLICT (uid, side) DO UPDATE SET position = excluded.position, updated = excluded.updated',
+            (uid, side, position, time.time())
+        )
+
+    def get(self, uid: str, side: str) -> int:
+        _check_side(side)
+        row = self._db.connection().execute(
+            'SELECT position FROM cursors WHERE uid = ? AND side = ?', (uid, side)
+        ).fetchone()
+        return DEFAULT_POSITIONS[side] if row is None else row[0]
+
+    def update(self, uid: str, side: str, func: Callable[[int], Optional[int]]) -> Tuple[int, Optional[int]]:
+        _check_side(side)
+        with self._db.transaction() as conn:
+            row = conn.execute('SELECT position FROM cursors WHERE uid = ? AND side = ?', (uid, side)).fetchone()
+            current = DEFAULT_POSITIONS[side] if row is None else row[0]
+            position = func(current)
+            if position is not None:
+                self._write(conn, uid, side, position)
+        if position is not None:
+            self._wrote()
+        return current, position
+
+    def reset(self, uid: str):
+        with self._db.transaction() as conn:
+            for side, position in DEFAULT_POSITIONS.items():
+                self._write(conn, uid, side, position)
+        self._wrote()
+
+    def _wrote(self):
+        if self.prune_every and next(self._writes) % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete the cursors of all but the `maxsize` most recently active users"""
+        with self._db.transaction() as conn:
+            conn.execute(
+                'DELETE FROM cursors WHERE uid IN ('
+                ' SELECT uid FROM cursors GROUP BY uid ORDER BY MAX(updated) DESC LIMIT -1 OFFSET ?)',
+                (self.maxsize,)
+            )
+
+
+def create_cursor_store() -> CursorStore:
+    """
+    Cursor store configured by the environment
+
+    CURSOR_STORE: 'memory' (default) or 'sqlite'
+    CURSOR_STORE_PATH: SQLite database path (default cursors.sqlite3 next to this file)
+    CURSOR_STORE_MAXSIZE: Maximum number of users kept
+    """
+    backend = os.getenv('CURSOR_STORE', 'memory').lower()
+    maxsize = os.getenv('CURSOR_STORE_MAXSIZE')
+    if backend == 'sqlite':
+        path = os.getenv('CURSOR_STORE_PATH') or DEFAULT_SQLITE_PATH
+        return SQLiteCursorStore(path, maxsize=int(maxsize)) if maxsize else SQLiteCursorStore(path)
+    if backend != 'memory':
+        raise ValueError(f"Unknown CURSOR_STORE {backend!r}; expected 'memory' or 'sqlite'")
+    return MemoryCursorStore(maxsize=int(maxsize)) if maxsize else MemoryCursorStore()
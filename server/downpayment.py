@@ -1,5 +1,11 @@
+import bisect
+
+import numpy as np
+import pandas as pd
 from flask import jsonify, request
 
+from http_cache import STATIC_MAX_AGE, not_modified, request_etag, with_etag
+
 TOYOTA_MODEL_CATEGORY = {
     "camry": "Sedan",
     "corolla": "Sedan",
@@ -48,6 +54,47 @@ def map_toyota_model_to_type(vehicle_model: str, fallback: str = "Sedan") -> str
     return fallback
 
 
+# Credit tiers by minimum score, best first, and their down payment adjustments
+CREDIT_TIERS = [
+    (750, "very_good"),
+    (700, "good"),
+    (650, "fair"),
+]
+CREDIT_TIER_ADJUSTMENTS = {
+    "very_good": -0.02,  # very good credit → lower DP
+    "good": 0.00,        # good credit → base
+    "fair": 0.03,        # fair credit → +3%
+    "poor": 0.07,        # poor credit → +7%
+}
+
+# Loan terms up to each limit (months), and the adjustment of each band;
+# longer terms than the last limit get the last adjustment
+LOAN_TERM_LIMITS = [24, 36, 48]
+LOAN_TERM_ADJUSTMENTS = [-0.01, 0.00, 0.02, 0.04]
+VEHICLE_TYPE_ADJUSTMENTS = {
+    "Sedan": 0.00,
+    "SUV": 0.02,
+    "Truck": 0.03,
+    "Luxury": 0.05,
+    "Sports": 0.07,
+}
+# Vehicle ages up to each limit (years), and the adjustment of each band
+VEHICLE_AGE_LIMITS = [1, 5]
+VEHICLE_AGE_ADJUSTMENTS = [
+    0.02,   # new car → slightly higher DP
+    0.00,   # normal depreciation
+    -0.02,  # older car → lower DP
+]
+
+
+def credit_tier(credit_score: int) -> str:
+    """Credit tier of a score: 'very_good', 'good', 'fair' or 'poor'"""
+    for minimum, tier in CREDIT_TIERS:
+        if credit_score >= minimum:
+            return tier
+    return "poor"
+
+
 def calculate_downpayment(car_price: float, credit_score: int, loan_term: int, 
                          vehicle_year: int, vehicle_model: str = None, 
                          vehicle_type: str = None, current_year: int = 2025) -> dict:
@@ -75,43 +122,17 @@ def calculate_downpayment(car_price: float, credit_score: int, loan_term: int,
     base_rate = 0.10  # 10% base down payment
 
     # --- Credit score adjustment ---
-    if credit_score >= 750:
-        credit_adj = -0.02  # very good credit → lower DP
-    elif credit_score >= 700:
-        credit_adj = 0.00   # good credit → base
-    elif credit_score >= 650:
-        credit_adj = 0.03   # fair credit → +3%
-    else:
-        credit_adj = 0.07   # poor credit → +7%
+    credit_adj = CREDIT_TIER_ADJUSTMENTS[credit_tier(credit_score)]
 
     # --- Loan term adjustment ---
-    if loan_term <= 24:
-        term_adj = -0.01
-    elif loan_term <= 36:
-        term_adj = 0.00
-    elif loan_term <= 48:
-        term_adj = 0.02
-    else:
-        term_adj = 0.04
+    term_adj = LOAN_TERM_ADJUSTMENTS[bisect.bisect_left(LOAN_TERM_LIMITS, loan_term)]
 
     # --- Vehicle type adjustment ---
-    type_adj_map = {
-        "Sedan": 0.00,
-        "SUV": 0.02,
-        "Truck": 0.03,
-        "Luxury": 0.05,
-        "Sports": 0.07,
-    }
-    type_adj = type_adj_map.get(vehicle_type, 0.00)
+    type_adj = VEHICLE_TYPE_ADJUSTMENTS.get(vehicle_type, 0.00)
 
     # --- Vehicle age adjustment ---
     age = current_year - vehicle_year
-    if age <= 1:
-        age_adj = 0.02  # new car → slightly higher DP
-    elif age <= 5:
-        age_adj = 0.00  # normal depreciation
-    else:
-        age_adj = -0.02  # older car → lower DP
+    age_adj = VEHICLE_AGE_ADJUSTMENTS[bisect.bisect_left(VEHICLE_AGE_LIMITS, age)]
 
     # --- Combine adjustments ---
     total_rate = base_rate + credit_adj + term_adj + type_adj + age_adj
@@ -128,6 +149,98 @@ def calculate_downpayment(car_price: float, credit_score: int, loan_term: int,
     }
 
 
+def _round_half_even(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Round like Python's round(): np.round, with the few values close enough
+    to a tie for its scaling error to matter redone by round() itself
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    fraction = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = (fraction < 1e-3) | ~(np.abs(scaled) < 2 ** 52)
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def _map_distinct(values, n: int, func) -> np.ndarray:
+    """func applied to each row's value, calling it once per distinct value; missing values map to func(None)"""
+    if values is None:
+        return np.full(n, func(None), dtype=object)
+    values = np.broadcast_to(np.asarray(values, dtype=object), (n,))
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return np.asarray([func(None if pd.isna(value) else value) for value in uniques] + [None], dtype=object)[codes]
+
+
+def _vehicle_types(vehicle_models, vehicle_types, n: int) -> np.ndarray:
+    """Vehicle type of each row: the given type, else the one inferred from the model"""
+    types = _map_distinct(vehicle_models, n, lambda model: map_toyota_model_to_type(model) if model else "Sedan")
+    if vehicle_types is not None:
+        given = _map_distinct(vehicle_types, n, lambda vehicle_type: vehicle_type.strip().title() if vehicle_type else None)
+        types = np.where(pd.isna(given), types, given)
+    return types
+
+
+def calculate_downpayments(car_prices, credit_scores, loan_terms, vehicle_years,
+                           vehicle_models=None, vehicle_types=None, current_year: int = 2025) -> dict:
+    """
+    Calculate downpayments for many cars in one vectorized pass.
+
+    Gives exactly the values calculate_downpayment gives for each row.
+    Every argument may be an array (NumPy, pandas or list) or a scalar
+    shared by all rows.
+
+    Args:
+        car_prices: Prices of the cars
+        credit_scores: Users' credit scores
+        loan_terms: Loan terms in months
+        vehicle_years: Years of the vehicles
+        vehicle_models: Model names (optional)
+        vehicle_types: Vehicle types (optional, inferred from the models where missing)
+        current_year: Current year (default: 2025)
+
+    Returns:
+        Dictionary with 'down_payment' and 'total_rate' float64 arrays
+    """
+    car_prices = np.asarray(car_prices)
+    credit_scores = np.asarray(credit_scores)
+    loan_terms = np.asarray(loan_terms)
+    vehicle_years = np.asarray(vehicle_years)
+    names = [np.asarray(values, dtype=object) for values in (vehicle_models, vehicle_types) if values is not None]
+    n = np.broadcast(car_prices, credit_scores, loan_terms, vehicle_years, *names).size
+
+    base_rate = 0.10  # 10% base down payment
+
+    # --- Credit score adjustment: tiers are checked best first ---
+    credit_adj = np.full(credit_scores.shape, CREDIT_TIER_ADJUSTMENTS["poor"])
+    for minimum, tier in reversed(CREDIT_TIERS):
+        credit_adj = np.where(credit_scores >= minimum, CREDIT_TIER_ADJUSTMENTS[tier], credit_adj)
+
+    # --- Loan term adjustment ---
+    term_adj = np.asarray(LOAN_TERM_ADJUSTMENTS)[np.searchsorted(LOAN_TERM_LIMITS, loan_terms, side='left')]
+
+    # --- Vehicle type adjustment ---
+    types = _vehicle_types(vehicle_models, vehicle_types, n)
+    type_codes, type_uniques = pd.factorize(types, use_na_sentinel=False)
+    type_adj = np.array([VEHICLE_TYPE_ADJUSTMENTS.get(value, 0.00) for value in type_uniques])[type_codes]
+
+    # --- Vehicle age adjustment ---
+    age = current_year - vehicle_years
+    age_adj = np.asarray(VEHICLE_AGE_ADJUSTMENTS)[np.searchsorted(VEHICLE_AGE_LIMITS, age, side='left')]
+
+    # --- Combine adjustments, in the scalar function's order ---
+    total_rate = base_rate + credit_adj + term_adj + type_adj + age_adj
+    total_rate = np.maximum(0.05, np.minimum(total_rate, 0.30))
+    total_rate = np.broadcast_to(total_rate, (n,))
+
+    down_payment = np.broadcast_to(car_prices, (n,)) * total_rate
+
+    return {
+        "down_payment": _round_half_even(down_payment, 7),
+        "total_rate": _round_half_even(total_rate * 100, 1)
+    }
+
+
 def downpayment_routes(app):
 
     @app.route('/downpayments', methods=['GET', 'POST'])
@@ -137,6 +250,12 @@ def downpayment_routes(app):
         Based on car price, credit score, loan term (months), vehicle type, and year.
         """
 
+        # A GET's result depends on nothing but its query parameters
+        etag = request_etag("downpayments") if request.method == "GET" else None
+        cached = not_modified(etag, STATIC_MAX_AGE)
+        if cached is not None:
+            return cached
+
         payload = request.args if request.method == "GET" else (request.get_json() or {})
         current_year = 2025
 
@@ -160,7 +279,9 @@ def downpayment_routes(app):
             current_year=current_year
         )
         
-        return jsonify(result)
+        if etag is None:
+            return jsonify(result)
+        return with_etag(jsonify(result), etag, STATIC_MAX_AGE)
         
 
 
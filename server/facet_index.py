@@ -0,0 +1,246 @@
+"""
+Bitset indexes for live catalog facet counts.
+
+For every value of every facet (price bucket, year, body type, model,
+mileage band) the catalog rows having that value are stored as a bitset,
+one bit per row packed into 64-bit words. A filter selects some values
+per facet; values of one facet are ORed together and facets are ANDed, so
+any combination of filters is answered with a few bitwise operations and
+popcounts over n_rows / 64 words, without touching the DataFrame.
+
+Counts follow the usual faceted-search convention: each facet is counted
+under the filters of all the other facets, so selecting "SUV" still
+shows how many sedans there would be. A price range parsed from a chat
+message filters on the exact prices rather than on the buckets it
+overlaps, so "SUV under 25k" does not count a $28,000 SUV.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Facets in response order
+FACETS = ('price', 'year', 'body_type', 'model', 'mileage')
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = [
+    ('under-10k', 0, 10000),
+    ('10k-20k', 10000, 20000),
+    ('20k-30k', 20000, 30000),
+    ('30k-40k', 30000, 40000),
+    ('40k-50k', 40000, 50000),
+    ('50k-plus', 50000, float('inf')),
+]
+MILEAGE_BUCKETS = [
+    ('under-50k', 0, 50000),
+    ('50k-150k', 50000, 150000),
+    ('150k-plus', 150000, float('inf')),
+]
+# Label of rows without a recorded mileage
+UNKNOWN_MILEAGE = 'unknown'
+
+# Selection key of an exact [min, max] price range; it filters like the
+# price facet
+PRICE_RANGE = 'price_range'
+
+# Number of set bits in every 16-bit value
+_POPCOUNT16 = np.array([bin(i).count('1') for i in range(1 << 16)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a uint64 bitset array (summed over the last axis)"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    halves = np.ascontiguousarray(words).view(np.uint16)
+    return _POPCOUNT16[halves].sum(axis=-1, dtype=np.int64)
+
+
+def _bitsets(codes: np.ndarray, n_values: int) -> np.ndarray:
+    """
+    Bitsets of the rows having each value code
+
+    Returns:
+        uint64 array of shape (n_values, ceil(n_rows / 64)); bit i of a
+        value's bitset is set when row i has that value
+    """
+    n_words = (len(codes) + 63) // 64
+    bits = np.zeros((n_values, n_words), dtype=np.uint64)
+    if not len(codes):
+        return bits
+    # Rows grouped by value (row order kept within a value), so every
+    # (value, word) pair is one run whose bits are ORed together; memory
+    # stays O(n_rows) instead of a dense n_values x n_rows matrix
+    rows = np.argsort(codes, kind='stable')
+    words = np.asarray(codes)[rows].astype(np.int64) * n_words + (rows >> 6)
+    masks = np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64))
+    starts = np.flatnonzero(np.r_[True, words[1:] != words[:-1]])
+    bits.reshape(-1)[words[starts]] = np.bitwise_or.reduceat(masks, starts)
+    return bits
+
+
+def _row_bits(rows: np.ndarray, n_rows: int) -> np.ndarray:
+    """Bitset of a set of row numbers, as a uint64 array of ceil(n_rows / 64) words"""
+    bits = np.zeros((n_rows + 63) // 64, dtype=np.uint64)
+    if not len(rows):
+        return bits
+    rows = np.sort(rows).astype(np.int64)
+    words = rows >> 6
+    masks = np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64))
+    starts = np.flatnonzero(np.r_[True, words[1:] != words[:-1]])
+    bits[words[starts]] = np.bitwise_or.reduceat(masks, starts)
+    return bits
+
+
+def _bucket_codes(values: np.ndarray, buckets: list) -> np.ndarray:
+    """Bucket number of each value; values below the first bound go in the first bucket"""
+    bounds = [upper for _, _, upper in buckets[:-1]]
+    return np.searchsorted(bounds, values, side='right')
+
+
+class FacetIndex:
+    """
+    Per-value row bitsets for every facet of a CatalogIndex.
+
+    `values[facet]` lists the facet's values in display order and
+    `bits[facet]` holds their bitsets in the same order.
+    """
+
+    def __init__(self, index):
+        """
+        Build the bitsets from a catalog index
+
+        Args:
+            index: CatalogIndex whose rows are counted; body types are the
+                ones it inferred from the model names
+        """
+        self.n_rows = len(index)
+        self.price_order = index.price_order
+        self.sorted_prices = index.sorted_prices
+        self.values: Dict[str, List[Any]] = {}
+        self.bits: Dict[str, np.ndarray] = {}
+
+        self._add('price', [label for label, _, _ in PRICE_BUCKETS], _bucket_codes(index.price, PRICE_BUCKETS))
+
+        years, year_codes = np.unique(index.year, return_inverse=True)
+        self._add('year', [int(year) for year in years], year_codes)
+
+        # Body types and models are per model code, so rows only need a lookup
+        body_types, model_body_codes = np.unique(index.model_body_types.astype(str), return_inverse=True)
+        self._add('body_type', list(body_types), model_body_codes[index.model_codes])
+
+        model_order = np.argsort(index.model_names.astype(str), kind='stable')
+        model_rank = np.empty(len(model_order), dtype=np.int64)
+        model_rank[model_order] = np.arange(len(model_order))
+        self._add('model', list(index.model_names[model_order]), model_rank[index.model_codes])
+
+        mileage_labels = [label for label, _, _ in MILEAGE_BUCKETS] + [UNKNOWN_MILEAGE]
+        if index.mileage is not None:
+            mileage = index.mileage.astype(float)
+            mileage_codes = np.where(np.isnan(mileage), len(MILEAGE_BUCKETS), _bucket_codes(mileage, MILEAGE_BUCKETS))
+        else:
+            mileage_codes = np.full(self.n_rows, len(MILEAGE_BUCKETS))
+        self._add('mileage', mileage_labels, mileage_codes)
+
+        self._all = np.bitwise_or.reduce(self.bits['price'], axis=0) if self.n_rows else np.zeros(0, dtype=np.uint64)
+        self._lookup = {
+            facet: {self._normalize(value): i for i, value in enumerate(values)}
+            for facet, values in self.values.items()
+        }
+
+    def _add(self, facet: str, values: list, codes: np.ndarray):
+        self.values[facet] = values
+        self.bits[facet] = _bitsets(np.asarray(codes), len(values))
+
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        return str(value).strip().lower()
+
+    def selection_bits(self, facet: str, values: Iterable[Any]) -> np.ndarray:
+        """
+        Rows having any of `values` of a facet, as a bitset
+
+        Values are matched case-insensitively; values the catalog does not
+        have match no rows.
+        """
+        positions = [self._lookup[facet][key] for key in map(self._normalize, values) if key in self._lookup[facet]]
+        if not positions:
+            return np.zeros_like(self._all)
+        return np.bitwise_or.reduce(self.bits[facet][positions], axis=0)
+
+    def price_range_bits(self, min_price: float, max_price: float) -> np.ndarray:
+        """Rows priced from min_price to max_price inclusive, as a bitset"""
+        start = np.searchsorted(self.sorted_prices, min_price, side='left')
+        stop = np.searchsorted(self.sorted_prices, max_price, side='right')
+        return _row_bits(self.price_order[start:stop], self.n_rows)
+
+    def intent_selections(self, intent: Dict[str, Any]) -> Dict[str, List[Any]]:
+        """
+        Facet values implied by a parsed query intent
+
+        A price range is kept exact, as [min, max] under PRICE_RANGE
+        (search scores the same range inclusively); a year selects that
+        year, models select every catalog model containing them and body
+        types match regardless of case.
+        """
+        selections: Dict[str, List[Any]] = {}
+        if intent.get('price_range'):
+            min_price, max_price = intent['price_range']
+            selections[PRICE_RANGE] = [float(min_price), float(max_price)]
+        if intent.get('year') is not None:
+            selections['year'] = [intent['year']]
+        models = list(intent.get('model_names', [])) + [name for name, _ in intent.get('fuzzy_models', [])]
+        if models:
+            needles = [model.lower() for model in models]
+            selections['model'] = [
+                name for name in self.values['model']
+                if any(needle in name.lower() for needle in needles)
+            ]
+        if intent.get('body_types'):
+            selections['body_type'] = list(intent['body_types'])
+        return selections
+
+    def counts(self, selections: Optional[Dict[str, Iterable[Any]]] = None) -> Dict[str, Any]:
+        """
+        Facet counts under a set of selections
+
+        Args:
+            selections: Selected values per facet; facets that are missing
+                or have no values are not filtered. A [min, max] under
+                PRICE_RANGE filters the price facet on exact prices, ANDed
+                with any selected price buckets
+
+        Returns:
+            Dictionary with 'total', the number of rows matching every
+            selection, and 'facets', mapping each facet to a list of
+            {'value', 'count'} in display order, each facet counted under
+            the selections of the other facets
+        """
+        masks = {
+            facet: self.selection_bits(facet, values)
+            for facet, values in (selections or {}).items()
+            if facet in self.bits and values
+        }
+        price_range = (selections or {}).get(PRICE_RANGE)
+        if price_range:
+            range_bits = self.price_range_bits(*price_range)
+            masks['price'] = masks['price'] & range_bits if 'price' in masks else range_bits
+
+        facets = {}
+        for facet in FACETS:
+            others = self._all
+            for other, mask in masks.items():
+                if other != facet:
+                    others = others & mask
+            counts = popcount(self.bits[facet] & others)
+            facets[facet] = [
+                {'value': value, 'count': int(count)}
+                for value, count in zip(self.values[facet], counts)
+            ]
+
+        matching = self._all
+        for mask in masks.values():
+            matching = matching & mask
+        return {
+            'total': int(popcount(matching)),
+            'facets': facets,
+        }
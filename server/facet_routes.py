@@ -0,0 +1,96 @@
+from flask import jsonify, request
+
+from chat_routes import get_chat_engine
+from facet_index import FACETS
+from http_cache import CATALOG_MAX_AGE, not_modified, request_etag, with_etag
+
+
+def _request_selections():
+    """
+    Selected facet values and message from the request.
+
+    GET takes ?q=<message> and one parameter per facet, repeated or
+    comma-separated (?body_type=SUV,Sedan&year=2020). POST takes a JSON
+    body {message, filters: {facet: [values]}}.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        message = data.get('message') or ''
+        selections = {}
+        for facet, values in (data.get('filters') or {}).items():
+            selections[facet] = values if isinstance(values, list) else [values]
+        return message, selections
+
+    message = request.args.get('q', '')
+    selections = {}
+    for facet in request.args:
+        if facet == 'q':
+            continue
+        values = []
+        for value in request.args.getlist(facet):
+            values.extend(part for part in value.split(',') if part.strip())
+        selections[facet] = values
+    return message, selections
+
+
+def register_facet_routes(app):
+    """
+    Register facet count routes with the Flask app.
+    Counts come from the bitset indexes of the shared chat search engine.
+    """
+
+    @app.route('/api/facets', methods=['GET', 'POST'])
+    def get_facets():
+        """
+        Get live facet counts for the catalog.
+
+        Facets are price (buckets such as 10k-20k), year, body_type, model
+        and mileage (bands such as under-50k). Values within a facet are
+        ORed, facets are ANDed, and each facet is counted under the filters
+        of the other facets.
+
+        Request:
+            GET ?q=<chat message>&<facet>=<values>, or POST {message, filters}
+
+        Returns:
+            JSON response with total, facets ({facet: [{value, count}]}),
+            selected and version
+        """
+        try:
+            message, selections = _request_selections()
+
+            unknown = sorted(set(selections) - set(FACETS))
+            if unknown:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unknown facet',
+                    'message': f"Unknown facet(s): {', '.join(unknown)}. Valid facets: {', '.join(FACETS)}"
+                }), 400
+
+            # GET counts depend only on the catalog and the query string
+            etag = None
+            if request.method == 'GET':
+                etag = request_etag('facets', get_chat_engine().index.version)
+                cached = not_modified(etag, CATALOG_MAX_AGE)
+                if cached is not None:
+                    return cached
+
+            result = get_chat_engine().facet_counts(message.strip() or None, selections)
+            result['success'] = True
+            if etag is None:
+                return jsonify(result), 200
+            return with_etag((jsonify(result), 200), request_etag('facets', result['version']), CATALOG_MAX_AGE)
+
+        except FileNotFoundError:
+            return jsonify({
+                'success': False,
+                'error': 'File not found',
+                'message': 'Toyota_price_table.csv not found'
+            }), 500
+
+        except Exception as e:
+            return jsonify({
+                'success': False,
+                'error': 'Server error',
+                'message': f'An unexpected error occurred: {str(e)}'
+            }), 500
@@ -0,0 +1,252 @@
+"""
+HTTP conditional caching for JSON routes.
+
+Routes describe their response with a strong ETag built from the versions
+of the data it was made from: the catalog version for catalog-derived
+responses, and per-user data versions for profiles and stored
+recommendations. A request whose If-None-Match already names the current
+ETag is answered with 304 Not Modified before any Firestore query.
+
+Per-user versions are random tokens replaced whenever the server changes
+the data, and forgotten after the same 15 minutes the recommendation cache
+keeps a list. An unknown version never produces a 304. Every worker has to
+see every change, so the versions live in the SQLite database the cursor
+store uses (CURSOR_STORE=sqlite, or DATA_VERSIONS=sqlite on its own). With
+the default in-memory backend another worker could change the data
+unnoticed, so per-user responses get no ETag at all.
+"""
+
+import abc
+import hashlib
+import itertools
+import os
+import threading
+import time
+from typing import Hashable, Optional
+
+from flask import make_response, request
+
+from cursor_store import DEFAULT_SQLITE_PATH, SQLiteDatabase
+from ttl_cache import TTLCache
+
+# Per-user responses may only be kept by the user's browser, and must be
+# revalidated on every use (which is what turns repeat loads into 304s)
+PRIVATE_REVALIDATE = 'private, no-cache'
+# Responses derived from the catalog alone
+CATALOG_MAX_AGE = 'public, max-age=300'
+# Responses that depend on nothing but the request
+STATIC_MAX_AGE = 'public, max-age=86400'
+
+
+def _new_version() -> str:
+    return os.urandom(8).hex()
+
+
+class DataVersions(abc.ABC):
+    """
+    Version tokens of per-user data, keyed by (scope, key), e.g.
+    ('user', uid) or ('cars', uid).
+
+    `shared` is True when every worker process sees the same versions;
+    only then are they used for ETags.
+    """
+
+    shared = False
+
+    @abc.abstractmethod
+    def get(self, scope: str, key: Hashable) -> Optional[str]:
+        """Current version, or None if it is not known"""
+
+    @abc.abstractmethod
+    def bump(self, scope: str, key: Hashable) -> str:
+        """Record that the data changed; returns its new version"""
+
+    @abc.abstractmethod
+    def ensure(self, scope: str, key: Hashable) -> str:
+        """Current version, atomically starting a new one if it is unknown"""
+
+    @abc.abstractmethod
+    def forget(self, scope: str, key: Hashable):
+        """Drop a version, e.g. when the data may have changed elsewhere"""
+
+
+class MemoryDataVersions(DataVersions):
+    """Versions kept in this process; only correct with a single worker"""
+
+    def __init__(self, maxsize: int = 65536, ttl: Optional[float] = 900.0):
+        self._versions = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, key: Hashable) -> Optional[str]:
+        return self._versions.get((scope, key))
+
+    def bump(self, scope: str, key: Hashable) -> str:
+        version = _new_version()
+        self._versions.set((scope, key), version)
+        return version
+
+    def ensure(self, scope: str, key: Hashable) -> str:
+        with self._lock:
+            return self.get(scope, key) or self.bump(scope, key)
+
+    def forget(self, scope: str, key: Hashable):
+        self._versions.pop((scope, key))
+
+
+class SQLiteDataVersions(DataVersions):
+    """
+    Versions in a SQLite database shared by every worker process on a
+    host, so a change made through one worker invalidates the ETags all of
+    them hand out. Versions older than `ttl` seconds count as unknown and
+    are deleted every `prune_every` writes.
+    """
+
+    shared = True
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, ttl: float = 900.0, prune_every: int = 1000, timeout: float = 5.0):
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._db = SQLiteDatabase(path, timeout)
+        self._writes = itertools.count(1)
+        with self._db.transaction() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS data_versions ('
+                ' scope TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, updated REAL NOT NULL,'
+                ' PRIMARY KEY (scope, key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS data_versions_updated ON data_versions (updated)')
+
+    def _select(self, conn, scope: str, key: Hashable) -> Optional[str]:
+        row = conn.execute(
+            'SELECT version FROM data_versions WHERE scope = ? AND key = ? AND updated > ?',
+            (scope, str(key), time.time() - self.ttl)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _write(self, conn, scope: str, key: Hashable) -> str:
+        version = _new_version()
+        conn.execute(
+            'INSERT INTO data_versions (scope, key, version, updated) VALUES (?, ?, ?, ?)'
+            ' ON CONFLICT (scope, key) DO UPDATE SET version = excluded.version, updated = excluded.updated',
+            (scope, str(key), version, time.time())
+        )
+        return version
+
+    def get(self, scope: str, key: Hashable) -> Optional[str]:
+        return self._select(self._db.connection(), scope, key)
+
+    def bump(self, scope: str, key: Hashable) -> str:
+        with self._db.transaction() as conn:
+            version = self._write(conn, scope, key)
+        self._wrote()
+        return version
+
+    def ensure(self, scope: str, key: Hashable) -> str:
+        with self._db.transaction() as conn:
+            version = self._select(conn, scope, key)
+            if version is not None:
+                return version
+            version = self._write(conn, scope, key)
+        self._wrote()
+        return version
+
+    def forget(self, scope: str, key: Hashable):
+        with self._db.transaction() as conn:
+            conn.execute('DELETE FROM data_versions WHERE scope = ? AND key = ?', (scope, str(key)))
+
+    def _wrote(self):
+        if self.prune_every and next(self._writes) % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        """Delete expired versions"""
+        with self._db.transaction() as conn:
+            conn.execute('DELETE FROM data_versions WHERE updated <= ?', (time.time() - self.ttl,))
+
+
+def create_data_versions() -> DataVersions:
+    """
+    Data version store configured by the environment
+
+    DATA_VERSIONS: 'memory' or 'sqlite' (default: the CURSOR_STORE backend,
+        so workers that share cursors also share versions)
+    CURSOR_STORE_PATH: SQLite database path (default cursors.sqlite3 next to cursor_store.py)
+    """
+    backend = (os.getenv('DATA_VERSIONS') or os.getenv('CURSOR_STORE', 'memory')).lower()
+    if backend == 'sqlite':
+        return SQLiteDataVersions(os.getenv('CURSOR_STORE_PATH') or DEFAULT_SQLITE_PATH)
+    if backend != 'memory':
+        raise ValueError(f"Unknown DATA_VERSIONS {backend!r}; expected 'memory' or 'sqlite'")
+    print("ℹ️ Per-user ETags disabled: set CURSOR_STORE=sqlite or DATA_VERSIONS=sqlite to share data versions between workers")
+    return MemoryDataVersions()
+
+
+data_versions = create_data_versions()
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value for a response made from these versions and parameters"""
+    return hashlib.sha1('\x1f'.join(map(str, parts)).encode()).hexdigest()[:32]
+
+
+def request_etag(*parts) -> str:
+    """ETag of a response that also depends on the request's query parameters"""
+    args = sorted((key, value) for key in request.args for value in request.args.getlist(key))
+    return make_etag(*parts, request.path, args)
+
+
+def user_etag(*parts, per_request: bool = False) -> Optional[str]:
+    """
+    ETag of a per-user response built from data versions, or None when
+    the versions are not shared between workers
+
+    Args:
+        parts: Versions and parameters the response was made from
+        per_request: Also depend on the request's path and query
+            parameters, like request_etag
+    """
+    if not data_versions.shared:
+        return None
+    return request_etag(*parts) if per_request else make_etag(*parts)
+
+
+def not_modified(etag: Optional[str], cache_control: str = PRIVATE_REVALIDATE):
+    """
+    304 response when the request's If-None-Match names `etag`, else None
+
+    Args:
+        etag: The response's current ETag, or None when it is not known
+            yet (which never matches)
+        cache_control: Cache-Control header of the 304
+    """
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def with_etag(result, etag: Optional[str], cache_control: str = PRIVATE_REVALIDATE):
+    """
+    Add ETag and Cache-Control to a route's successful result
+
+    Args:
+        result: Response or (response, status) as returned by a route;
+            only 200 responses are tagged
+        etag: The response's ETag, or None to only set Cache-Control
+        cache_control: Cache-Control header
+
+    Returns:
+        The tagged response, or 304 when the request already has it
+    """
+    response = make_response(result)
+    if response.status_code != 200:
+        return response
+    cached = not_modified(etag, cache_control)
+    if cached is not None:
+        return cached
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
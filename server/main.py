@@ -18,6 +18,8 @@ BASE_DIR = Path(__file__).parent.resolve()
 ENV_PATH = BASE_DIR / '.env'
 from users import register_users_routes, get_users_routes # Users routes
 from cars import get_cars_routes # Cars routes
+from chat_routes import register_chat_routes # Chat recommendation routes
+from facet_routes import register_facet_routes # Catalog facet count routes
 
 # Load environment variables from .env file
 # Explicitly specify the path to ensure it's found
@@ -122,6 +124,26 @@ except Exception as e:
     import traceback
     traceback.print_exc()
 
+# Register chat recommendation routes
+print("🔍 Registering chat routes...")
+try:
+    register_chat_routes(app)
+    print("✅ Chat routes registered successfully")
+except Exception as e:
+    print(f"❌ Error registering chat routes: {e}")
+    import traceback
+    traceback.print_exc()
+
+# Register catalog facet routes
+print("🔍 Registering facet routes...")
+try:
+    register_facet_routes(app)
+    print("✅ Facet routes registered successfully")
+except Exception as e:
+    print(f"❌ Error registering facet routes: {e}")
+    import traceback
+    traceback.print_exc()
+
 # Print all registered routes for debugging
 print("\n📋 All registered routes:")
 for rule in app.url_map.iter_rules():
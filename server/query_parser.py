@@ -0,0 +1,291 @@
+"""
+Single-pass query intent parser for chat search.
+
+All lexicon terms, model names and numeric triggers are folded into one
+precompiled master pattern. A single `finditer` over the lowercased query
+reports every position where something interesting starts; price patterns
+are then only tried, anchored, at those positions. The output matches the
+structured intent produced by the original per-term regex extractors.
+"""
+
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Body type keywords (matched on word boundaries)
+BODY_TYPE_TERMS = {
+    'sedan': ['sedan', 'car'],
+    'suv': ['suv', 'suvs', 'sport utility', 'sport-utility', 'sport utility vehicle', 'crossover', 'cross-over'],
+    'truck': ['truck', 'trucks', 'pickup', 'pick-up', 'pickup truck'],
+    'hatchback': ['hatchback', 'hatch-back', 'hatch'],
+    'sports car': ['sports car', 'sportscar', 'sporty car'],
+}
+
+# A body type term directly followed by one of these is part of a model name
+MODELS_AFTER_BODY_TERM = ['rav4', 'corolla', 'camry', 'prius', 'yaris']
+
+# Feature keywords (matched as substrings)
+FEATURE_TERMS = {
+    'fuel efficient': ['fuel efficient', 'good gas mileage', 'mpg', 'economy', 'efficient'],
+    'hybrid': ['hybrid', 'electric', 'ev', 'plug-in'],
+    'awd': ['awd', 'all wheel drive', '4wd', 'four wheel drive'],
+    'spacious': ['spacious', 'roomy', 'large', 'big'],
+    'luxury': ['luxury', 'premium', 'high-end', 'nice'],
+    'family': ['family', 'kids', 'children', 'safe'],
+    'reliable': ['reliable', 'dependable', 'durable'],
+}
+
+# Use case keywords (matched as substrings)
+USE_CASE_TERMS = {
+    'commuting': ['commute', 'daily', 'work', 'driving to work'],
+    'family': ['family', 'kids', 'children'],
+    'off-road': ['off-road', 'off road', 'camping', 'outdoor'],
+    'cargo': ['cargo', 'hauling', 'towing', 'luggage'],
+}
+
+# Words that mean "cheapest part of the catalog" when no number is given
+CHEAP_WORDS = ['cheap', 'affordable', 'budget', 'inexpensive']
+
+# Model name patterns, in detection order (longer names first). Each
+# pattern is matched case-insensitively between word boundaries.
+MODEL_PATTERNS = [
+    ('Land Cruiser Amazon', r'land\s+cruiser\s+amazon'),
+    ('Land Cruiser', r'land\s+cruiser(?!\s+amazon)'),
+    ('4Runner', r'4runner|4-runner'),
+    ('RAV4', r'rav4|rav\s*4'),
+    ('C-HR', r'c-hr|chr'),
+    ('GT86', r'gt86'),
+] + [
+    (model, re.escape(model.lower()))
+    for model in [
+        'Camry', 'Corolla', 'Highlander', 'Tundra', 'Tacoma',
+        'Prius', 'Avalon', 'Sequoia', 'Yaris', 'Supra',
+        'AYGO', 'Venza', 'Sienna',
+    ]
+]
+
+# Price patterns, in priority order. Each entry is (trigger, pattern):
+# a keyword trigger is tried where that keyword occurs, '#' at the start
+# of every digit run and '$' at every dollar sign.
+_PRICE_VALUE = r'\$?\s*(\d+)[,.]?(\d*)\s*k?'
+RANGE_PATTERNS = [
+    ('between', r'between\s*' + _PRICE_VALUE + r'\s*and\s*' + _PRICE_VALUE),
+    ('#', _PRICE_VALUE + r'\s*-\s*' + _PRICE_VALUE),
+]
+SINGLE_PATTERNS = [
+    ('under', r'under\s*' + _PRICE_VALUE),
+    ('below', r'below\s*' + _PRICE_VALUE),
+    ('less than', r'less than\s*' + _PRICE_VALUE),
+    ('up to', r'up to\s*' + _PRICE_VALUE),
+    ('#', _PRICE_VALUE + r'\s*or less'),
+    ('around', r'around\s*' + _PRICE_VALUE),
+    ('about', r'about\s*' + _PRICE_VALUE),
+    ('$', r'\$\s*(\d{1,3}),?(\d{3})'),
+]
+
+_YEAR_RE = re.compile(r'\b(20\d{2})\b')
+
+
+def _build_lexicon():
+    """
+    Map every literal term to the actions it triggers.
+
+    Several terms can start at the same position ('suv' and 'suvs', or
+    'family' as both a feature and a use case). The master pattern only
+    reports the longest term at each position, so every term also carries
+    the actions of all shorter terms that are prefixes of it.
+    """
+    actions = {}
+
+    def add(term, action):
+        actions.setdefault(term, []).append(action)
+
+    for body_type, terms in BODY_TYPE_TERMS.items():
+        for term in terms:
+            add(term, ('body', term))
+    for feature, terms in FEATURE_TERMS.items():
+        for term in terms:
+            add(term, ('feature', feature))
+    for use_case, terms in USE_CASE_TERMS.items():
+        for term in terms:
+            add(term, ('use_case', use_case))
+    for word in CHEAP_WORDS:
+        add(word, ('cheap', word))
+    for kind, patterns in (('range', RANGE_PATTERNS), ('single', SINGLE_PATTERNS)):
+        for i, (trigger, _) in enumerate(patterns):
+            if trigger not in ('#', '$'):
+                add(trigger, (kind, i))
+
+    expanded = {
+        term: [action for prefix in actions if term.startswith(prefix) for action in actions[prefix]]
+        for term in actions
+    }
+    return expanded
+
+
+_LEXICON = _build_lexicon()
+_RANGE_RES = [re.compile(pattern) for _, pattern in RANGE_PATTERNS]
+_SINGLE_RES = [re.compile(pattern) for _, pattern in SINGLE_PATTERNS]
+_DIGIT_RANGES = [i for i, (trigger, _) in enumerate(RANGE_PATTERNS) if trigger == '#']
+_DIGIT_SINGLES = [i for i, (trigger, _) in enumerate(SINGLE_PATTERNS) if trigger == '#']
+_DOLLAR_SINGLES = [i for i, (trigger, _) in enumerate(SINGLE_PATTERNS) if trigger == '$']
+
+
+def _build_master():
+    """Compile the single scanning pattern and the model group lookup"""
+    # Longest first, so the alternation reports the longest term at a position
+    lexicon = '|'.join(re.escape(term) for term in sorted(_LEXICON, key=len, reverse=True))
+    models = '|'.join(f'(?P<m{i}>{pattern})' for i, (_, pattern) in enumerate(MODEL_PATTERNS))
+    master = re.compile(
+        r'(?:(?=(?P<lex>' + lexicon + r')))?'
+        r'(?:(?=(?P<num>(?<!\d)\d|\$)))?'
+        r'(?:(?=(?P<model>\b(?i:' + models + r')\b)))?'
+        # Skip positions where nothing starts
+        r'(?(lex)|(?(num)|(?(model)|(?!))))'
+    )
+    model_groups = [(master.groupindex[f'm{i}'], model) for i, (model, _) in enumerate(MODEL_PATTERNS)]
+    return master, model_groups
+
+
+_MASTER, _MODEL_GROUPS = _build_master()
+
+
+def _is_word(ch: str) -> bool:
+    """Same definition of a word character as the `re` module's \\w"""
+    return ch.isalnum() or ch == '_'
+
+
+def _price_from_match(match, is_range: bool) -> tuple:
+    """Turn a matched price pattern into a (min, max) price range"""
+    groups = match.groups()
+    match_text = match.group(0).lower()
+    if is_range:
+        min_val = int((groups[0] or '') + (groups[1] or ''))
+        max_val = int((groups[2] or '') + (groups[3] or ''))
+        if 'k' in match_text or min_val < 1000:
+            min_val *= 1000
+            max_val *= 1000
+        return (min_val, max_val)
+
+    price = int(''.join(g for g in groups if g))
+    if 'k' in match_text or price < 100:
+        price *= 1000
+    return (0, price)
+
+
+def parse_query(query: str, cheap_price: Optional[Callable[[], float]] = None) -> Dict[str, Any]:
+    """
+    Parse a chat query into a structured search intent in a single pass
+
+    Args:
+        query: User's query string
+        cheap_price: Returns the price cap used for "cheap"/"affordable"
+            queries that give no number; only called when needed
+
+    Returns:
+        Dictionary with price_range, year, body_types, features,
+        use_cases and model_names keys
+    """
+    text = query.lower()
+
+    range_matches = [None] * len(_RANGE_RES)
+    single_matches = [None] * len(_SINGLE_RES)
+    body_first = {}
+    body_bounded = set()
+    features = set()
+    use_cases = set()
+    models = set()
+    cheap = False
+    has_digit = False
+    year = None
+
+    for match in _MASTER.finditer(text):
+        pos = match.start()
+
+        term = match.group('lex')
+        if term is not None:
+            for kind, value in _LEXICON[term]:
+                if kind == 'feature':
+                    features.add(value)
+                elif kind == 'use_case':
+                    use_cases.add(value)
+                elif kind == 'body':
+                    body_first.setdefault(value, pos)
+                    end = pos + len(value)
+                    if (pos == 0 or not _is_word(text[pos - 1])) and (end == len(text) or not _is_word(text[end])):
+                        body_bounded.add(value)
+                elif kind == 'cheap':
+                    cheap = True
+                elif kind == 'range':
+                    if range_matches[value] is None:
+                        range_matches[value] = _RANGE_RES[value].match(text, pos)
+                elif single_matches[value] is None:
+                    single_matches[value] = _SINGLE_RES[value].match(text, pos)
+
+        if match.group('num') is not None:
+            if text[pos] == '$':
+                for i in _DOLLAR_SINGLES:
+                    if single_matches[i] is None:
+                        single_matches[i] = _SINGLE_RES[i].match(text, pos)
+            else:
+                has_digit = True
+                for i in _DIGIT_RANGES:
+                    if range_matches[i] is None:
+                        range_matches[i] = _RANGE_RES[i].match(text, pos)
+                for i in _DIGIT_SINGLES:
+                    if single_matches[i] is None:
+                        single_matches[i] = _SINGLE_RES[i].match(text, pos)
+                if year is None:
+                    year_match = _YEAR_RE.match(text, pos)
+                    if year_match:
+                        year = int(year_match.group(1))
+
+        if match.group('model') is not None:
+            for group, model in _MODEL_GROUPS:
+                if match.start(group) != -1:
+                    models.add(model)
+                    break
+
+    # Price range: "cheap" without numbers, then ranges, then single values
+    price_range = None
+    if cheap and not has_digit and cheap_price is not None:
+        price_range = (0, cheap_price())
+    else:
+        for range_match in range_matches:
+            if range_match:
+                price_range = _price_from_match(range_match, is_range=True)
+                break
+        else:
+            for single_match in single_matches:
+                if single_match:
+                    price_range = _price_from_match(single_match, is_range=False)
+                    break
+
+    # Body types: first word-bounded term that is not the start of a model name
+    body_types = []
+    for body_type, terms in BODY_TYPE_TERMS.items():
+        for term in terms:
+            if term in body_bounded:
+                start = body_first[term] + len(term)
+                text_after = text[start:start + 5].strip()
+                if not any(model in text_after for model in MODELS_AFTER_BODY_TERM):
+                    body_types.append(body_type)
+                    break
+
+    # Model names: drop shorter names covered by a longer match
+    matched_models: List[str] = []
+    for model, _ in MODEL_PATTERNS:
+        if any(model in matched and len(model) < len(matched) for matched in matched_models):
+            continue
+        if model in models:
+            matched_models = [m for m in matched_models if m not in model or len(m) >= len(model)]
+            if model not in matched_models:
+                matched_models.append(model)
+
+    return {
+        'price_range': price_range,
+        'year': year,
+        'body_types': body_types,
+        'features': [feature for feature in FEATURE_TERMS if feature in features],
+        'use_cases': [use_case for use_case in USE_CASE_TERMS if use_case in use_cases],
+        'model_names': matched_models,
+    }
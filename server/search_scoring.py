@@ -0,0 +1,338 @@
+"""
+Relevance scoring for chat car search.
+
+Catalog models are described by a precomputed tag matrix (models x tags)
+built once per catalog. A parsed query intent is turned into a weight vector
+over those tags, so all feature and use-case boosts reduce to one small
+matrix-vector product, broadcast to rows by model code. The weights below
+are plain data and can be tuned without touching the scoring code.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Model-list tags: a row scores one point for every listed model its
+# model name contains (case-insensitive)
+MODEL_TAGS = {
+    'hybrid': ['Prius', 'RAV4', 'Highlander', 'Camry', 'Avalon', 'Venza'],
+    'efficient': ['Prius', 'Corolla', 'Camry', 'Yaris', 'AYGO'],
+    'family': ['Highlander', 'Sienna', 'RAV4', '4Runner', 'Sequoia', 'Venza'],
+    'spacious': ['Highlander', 'Sequoia', 'Land Cruiser', '4Runner', 'Sienna'],
+    'truck': ['Tundra', 'Tacoma'],
+    'commute': ['Corolla', 'Camry', 'Prius', 'Yaris', 'AYGO'],
+    'off-road': ['4Runner', 'Land Cruiser', 'Tacoma', 'Tundra'],
+}
+
+# Small cars: a small body type or one of these models
+SMALL_BODY_TYPES = ['Hatchback', 'Sedan']
+SMALL_MODELS = ['Yaris', 'AYGO', 'iQ', 'Corolla']
+
+# Tag weights added when the parsed intent contains `value` in any of `fields`.
+# Besides the model-list tags, weights can target 'small', one-hot body type
+# columns ('body:SUV') and 'all', which applies to every row.
+INTENT_TAG_WEIGHTS = [
+    (('features',), 'hybrid', {'hybrid': 25}),
+    (('features',), 'fuel efficient', {'efficient': 20, 'body:SUV': -15, 'body:Truck': -15}),
+    (('features', 'use_cases'), 'family', {'family': 25, 'body:SUV': 15}),
+    (('features',), 'spacious', {'spacious': 20, 'small': -20}),
+    (('body_types',), 'truck', {'truck': 30, 'all': -30, 'body:Truck': 30}),
+    (('use_cases',), 'commuting', {'commute': 18, 'body:Sedan': 10, 'body:Hatchback': 10}),
+    (('use_cases',), 'off-road', {'off-road': 25, 'body:SUV': 15, 'body:Truck': 15}),
+]
+
+# Tag weights for open-ended queries (no body type, year or price given)
+OPEN_QUERY_TAG_WEIGHTS = {'body:SUV': 3, 'body:Sedan': 3}
+
+
+def build_tag_matrix(index) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Build the models x tags matrix for a catalog index
+
+    Every tag depends only on the model, so a row's tags are the row of its
+    model code.
+
+    Args:
+        index: CatalogIndex to describe
+
+    Returns:
+        (matrix, columns) where columns maps tag names to column numbers
+    """
+    names = list(MODEL_TAGS) + ['small']
+    names += ['body:' + body_type for body_type in np.unique(index.model_body_types)]
+    names.append('all')
+    columns = {name: i for i, name in enumerate(names)}
+
+    # Tags are computed per distinct model
+    per_model = np.zeros((len(index.model_names), len(names)))
+    for tag, models in MODEL_TAGS.items():
+        for model in models:
+            per_model[:, columns[tag]] += index.model_contains(model)
+    small = np.isin(index.model_body_types, SMALL_BODY_TYPES)
+    for model in SMALL_MODELS:
+        small |= index.model_contains(model)
+    per_model[:, columns['small']] = small
+    for i, body_type in enumerate(index.model_body_types):
+        per_model[i, columns['body:' + body_type]] = 1
+    per_model[:, columns['all']] = 1
+
+    return per_model, columns
+
+
+def base_scores(index) -> np.ndarray:
+    """
+    Query-independent part of the relevance score
+
+    Newer models and lower mileage score higher regardless of the query.
+    """
+    scores = np.zeros(len(index))
+    year = index.year
+
+    # Prefer newer models
+    if len(index) > 0:
+        max_year = index.stats.max_year
+        min_year = index.stats.min_year
+        if max_year > min_year:
+            recent_cars = year >= (max_year - 5)
+            scores[recent_cars] += 15
+            older_cars = year < (max_year - 5)
+            scores[older_cars] += ((year[older_cars] - min_year) / (max_year - min_year)) * 8
+
+    # Prefer lower mileage
+    if index.mileage is not None and len(index) > 0:
+        mileage = index.mileage
+        scores[mileage <= 100000] += 15
+        scores[(mileage > 100000) & (mileage <= 200000)] += 5
+        scores[mileage > 200000] -= 5
+
+    return scores
+
+
+def intent_tag_weights(intent: Dict[str, Any], columns: Dict[str, int]) -> np.ndarray:
+    """
+    Turn a parsed intent into a weight vector over the tag columns
+
+    Args:
+        intent: Parsed query intent
+        columns: Tag column numbers from build_tag_matrix
+
+    Returns:
+        Weight vector with one entry per tag column
+    """
+    weights = np.zeros(len(columns))
+
+    def add(tag_weights, scale=1.0):
+        for tag, weight in tag_weights.items():
+            # Body types missing from this catalog simply have no rows
+            if tag in columns:
+                weights[columns[tag]] += weight * scale
+
+    fuzzy_tags = intent.get('fuzzy_tags', ())
+    for fields, value, tag_weights in INTENT_TAG_WEIGHTS:
+        if any(value in intent[field] for field in fields):
+            add(tag_weights)
+        else:
+            # Misspelled terms count in proportion to their similarity
+            similarity = max((s for (field, v), s in fuzzy_tags if v == value and field in fields), default=0.0)
+            if similarity:
+                add(tag_weights, similarity)
+
+    if not intent['body_types'] and intent['year'] is None and not intent['price_range']:
+        add(OPEN_QUERY_TAG_WEIGHTS)
+
+    return weights
+
+
+def _open_price_scores(index) -> np.ndarray:
+    """Price score for queries without a price range: prefer prices near the median"""
+    scores = np.zeros(len(index))
+    # Every price equals the median when the catalog has a single price
+    if len(index) > 0 and index.stats.max_price > index.stats.min_price:
+        median_price = index.stats.median_price
+        within_reasonable_range = np.abs(index.price - median_price) <= (median_price * 0.5)
+        scores[within_reasonable_range] += 8
+        scores[~within_reasonable_range] -= 5
+    return scores
+
+
+def score_intents(index, intents: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Relevance scores of every catalog row for a batch of parsed intents
+
+    All intents are scored together as one queries x rows matrix; a single
+    query is just a batch of one, so both paths produce identical scores.
+
+    Args:
+        index: CatalogIndex to score
+        intents: Parsed query intents
+
+    Returns:
+        Score matrix with one row per intent and one column per catalog row
+    """
+    n_queries = len(intents)
+    year = index.year
+    price = index.price
+    scores = np.repeat(index.base_scores[np.newaxis, :], n_queries, axis=0)
+
+    # Price filtering
+    with_price = [i for i, intent in enumerate(intents) if intent['price_range']]
+    if with_price:
+        bounds = np.array([intents[i]['price_range'] for i in with_price], dtype=float)
+        min_price = bounds[:, :1]
+        max_price = bounds[:, 1:]
+        in_range = (price >= min_price) & (price <= max_price)
+        slightly_over = (price > max_price) & (price <= max_price * 1.2)
+        slightly_under = (price < min_price) & (price >= min_price * 0.8)
+        far_out_of_range = (price > max_price * 1.2) | (price < min_price * 0.8)
+        scores[with_price] += 60 * in_range - 10 * (slightly_over | slightly_under) - 40 * far_out_of_range
+    if len(with_price) < n_queries:
+        without_price = [i for i, intent in enumerate(intents) if not intent['price_range']]
+        scores[without_price] += _open_price_scores(index)
+
+    # Year and body type matching
+    body_queries = [i for i, intent in enumerate(intents) if intent['body_types']]
+    body_match = {}
+    if body_queries:
+        per_model = np.array([np.isin(index.model_body_types, intents[i]['body_types']) for i in body_queries])
+        for i, matches in zip(body_queries, per_model[:, index.model_codes]):
+            body_match[i] = matches
+
+    year_queries = [i for i, intent in enumerate(intents) if intent['year'] is not None]
+    if year_queries:
+        target_year = np.array([[intents[i]['year']] for i in year_queries])
+        year_exact_match = year == target_year
+        year_close_match = (np.abs(year - target_year) <= 2) & ~year_exact_match
+        year_far = np.abs(year - target_year) > 2
+        for row, i in enumerate(year_queries):
+            if i in body_match:
+                matches = body_match[i]
+                scores[i] += (
+                    100 * (year_exact_match[row] & matches)
+                    + 60 * (year_close_match[row] & matches)
+                    + 10 * (year_exact_match[row] & ~matches)
+                    + 30 * (matches & year_far[row])
+                    - 40 * ~matches
+                )
+            else:
+                scores[i] += 50 * year_exact_match[row] + 25 * year_close_match[row] - 20 * year_far[row]
+    for i, matches in body_match.items():
+        if intents[i]['year'] is None:
+            scores[i] += 50 * matches - 50 * ~matches
+
+    # Model name matching, evaluated once per distinct model. Fuzzy term
+    # matches are scaled by their similarity.
+    model_queries = [
+        i for i, intent in enumerate(intents)
+        if intent['model_names'] or intent.get('fuzzy_models')
+    ]
+    if model_queries:
+        model_boost = np.zeros((len(model_queries), len(index.model_names)))
+        for row, i in enumerate(model_queries):
+            matches = [(model, 1.0) for model in intents[i]['model_names']]
+            for model, similarity in matches + list(intents[i].get('fuzzy_models', ())):
+                exact_match = index.model_names_lower == model.lower()
+                model_boost[row, exact_match] += 80 * similarity
+                model_boost[row, index.model_contains(model) & ~exact_match] += 50 * similarity
+        scores[model_queries] += model_boost[:, index.model_codes]
+
+    # Feature and use case boosts: one matrix product for the whole batch
+    weights = np.array([intent_tag_weights(intent, index.tag_columns) for intent in intents])
+    scores += (weights @ index.model_tags.T)[:, index.model_codes]
+
+    return scores
+
+
+def score_intent(index, intent: Dict[str, Any]) -> np.ndarray:
+    """
+    Relevance score of every catalog row for a parsed intent
+
+    Args:
+        index: CatalogIndex to score
+        intent: Parsed query intent
+
+    Returns:
+        Score array with one entry per catalog row
+    """
+    return score_intents(index, [intent])[0]
+
+
+def select_rows(
+    scores: np.ndarray,
+    intent: Dict[str, Any],
+    limit: int,
+    bonus: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Best rows for one query, dropping weak matches for specific queries
+
+    Args:
+        scores: Score array with one entry per catalog row
+        intent: Parsed query intent the scores were computed for
+        limit: Maximum number of rows to return
+        bonus: Optional extra score per row (e.g. semantic similarity) that
+            affects the order of the results but not which rows are
+            relevant enough to be returned
+
+    Returns:
+        Row numbers, best first; empty when nothing is relevant enough
+    """
+    ranking = scores if bonus is None else scores + bonus
+    if len(scores) > 0 and has_specific_criteria(intent):
+        min_acceptable_score = scores.max() * 0.4
+        eligible = scores >= min_acceptable_score
+        ranking = np.where(eligible, ranking, -np.inf)
+        limit = min(limit, int(eligible.sum()))
+    return top_k(ranking, limit)
+
+
+def has_specific_criteria(intent: Dict[str, Any]) -> bool:
+    """Whether the intent narrows the search enough to drop weak matches"""
+    return bool(
+        intent['year'] is not None or intent['body_types']
+        or intent['price_range'] or intent['model_names']
+        or intent.get('fuzzy_models')
+    )
+
+
+def fallback_scores(index) -> np.ndarray:
+    """Scores for the broader search used when nothing relevant is found"""
+    scores = np.zeros(len(index))
+    if len(index) > 0:
+        max_year = index.stats.max_year
+        min_year = index.stats.min_year
+        if max_year > min_year:
+            scores += ((index.year - min_year) / (max_year - min_year)) * 20
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Row numbers of the `k` highest scores, best first
+
+    Uses a partial selection instead of sorting every row. Ties are broken
+    by catalog order (lower row number first), matching a stable sort.
+
+    Args:
+        scores: Score array with one entry per catalog row
+        k: Number of rows to return
+
+    Returns:
+        Array of at most `k` row numbers
+    """
+    n = len(scores)
+    k = min(max(k, 0), n)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        kth_score = scores[candidates].min()
+        # argpartition picks arbitrary rows among those tied with the k-th
+        # score, so take the tied rows in catalog order instead
+        above = candidates[scores[candidates] > kth_score]
+        tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
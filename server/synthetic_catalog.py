@@ -0,0 +1,131 @@
+"""
+Synthetic car catalog generator.
+
+Produces catalogs with the same schema as Toyota_price_table.csv (Maker,
+Genmodel, Genmodel_ID, Year, Entry_price, mileage, Image_url) at any size,
+for load testing and benchmarking search. Prices depreciate with age,
+mileage grows with age, and image URLs carry the same kind of long query
+strings as the real data.
+
+Usage:
+    python synthetic_catalog.py --rows 100000 --out catalog_100k.csv [--multi-make]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# (model, new price in USD, relative popularity)
+TOYOTA_MODELS = [
+    ('RAV4', 32000, 10), ('Camry', 28000, 9), ('Corolla', 23000, 10), ('Highlander', 40000, 6),
+    ('Tacoma', 35000, 6), ('Tundra', 45000, 4), ('4Runner', 42000, 4), ('Prius', 28000, 6),
+    ('Sienna', 40000, 3), ('Sequoia', 60000, 2), ('Land Cruiser', 85000, 2),
+    ('Land Cruiser Amazon', 60000, 1), ('Avalon', 38000, 2), ('Venza', 35000, 2),
+    ('C-HR', 25000, 3), ('Yaris', 17000, 5), ('AYGO', 14000, 3), ('GT86', 30000, 2),
+    ('Supra', 50000, 1), ('Avensis', 24000, 3), ('Auris', 20000, 3), ('Verso', 22000, 2),
+    ('iQ', 13000, 1), ('Celica', 22000, 1), ('MR2', 24000, 1),
+]
+
+OTHER_MAKES = {
+    'Honda': [('Civic', 25000, 9), ('Accord', 29000, 7), ('CR-V', 31000, 9), ('Pilot', 40000, 4), ('Odyssey', 38000, 3)],
+    'Ford': [('F-150', 42000, 10), ('Escape', 29000, 6), ('Explorer', 38000, 5), ('Mustang', 33000, 3), ('Ranger', 33000, 3)],
+    'Chevrolet': [('Silverado', 43000, 9), ('Equinox', 28000, 6), ('Malibu', 25000, 4), ('Tahoe', 58000, 3)],
+    'Nissan': [('Altima', 26000, 6), ('Rogue', 29000, 7), ('Sentra', 21000, 5), ('Frontier', 31000, 3)],
+    'Hyundai': [('Elantra', 22000, 6), ('Tucson', 28000, 6), ('Santa Fe', 31000, 4), ('Sonata', 26000, 4)],
+}
+
+IMAGE_HOSTS = [
+    'https://images.collectingcars.com/{id:06d}/main.jpg?w=1263&fit=fillmax&crop=edges&auto=format,compress&cs=srgb&q=85',
+    'https://media.example-dealer.com/wp-content/uploads/sites/5/{id}/{model}.jpg',
+    'https://cdn.example-listings.com/images/mgl/{id}/s1/{year}-{make}-{model}.jpg',
+]
+
+
+def _model_table(multi_make: bool) -> pd.DataFrame:
+    rows = [('Toyota', model, price, weight) for model, price, weight in TOYOTA_MODELS]
+    if multi_make:
+        for make, models in OTHER_MAKES.items():
+            rows += [(make, model, price, weight) for model, price, weight in models]
+    table = pd.DataFrame(rows, columns=['Maker', 'Genmodel', 'new_price', 'weight'])
+    table['Genmodel_ID'] = [f'{i + 1}_{j + 1}' for i, j in zip(
+        table.groupby('Maker', sort=False).ngroup(), table.groupby('Maker', sort=False).cumcount()
+    )]
+    return table
+
+
+def generate_catalog(
+    n_rows: int,
+    seed: int = 0,
+    multi_make: bool = False,
+    min_year: int = 1998,
+    max_year: int = 2024,
+) -> pd.DataFrame:
+    """
+    Generate a synthetic catalog
+
+    Args:
+        n_rows: Number of listings to generate
+        seed: Random seed, so the same arguments always give the same catalog
+        multi_make: Include makes other than Toyota
+        min_year: Oldest model year
+        max_year: Newest model year
+
+    Returns:
+        DataFrame with the Toyota_price_table.csv columns
+    """
+    rng = np.random.default_rng(seed)
+    table = _model_table(multi_make)
+
+    weights = table['weight'].to_numpy(dtype=float)
+    picks = rng.choice(len(table), size=n_rows, p=weights / weights.sum())
+
+    # Newer years are more common in listings
+    years = np.arange(min_year, max_year + 1)
+    year_weights = np.linspace(1.0, 3.0, len(years))
+    year = rng.choice(years, size=n_rows, p=year_weights / year_weights.sum())
+    age = max_year - year
+
+    # ~12% depreciation per year with noise, and a floor for very old cars
+    new_price = table['new_price'].to_numpy()[picks]
+    price = new_price * 0.88 ** age * rng.lognormal(0.0, 0.12, n_rows)
+    price = np.maximum(price, 1500).round().astype(np.int64)
+
+    mileage = (age * rng.normal(12000, 3000, n_rows) + rng.integers(0, 8000, n_rows))
+    mileage = np.clip(mileage, 0, 350000).round().astype(np.int64)
+
+    makers = table['Maker'].to_numpy()[picks]
+    models = table['Genmodel'].to_numpy()[picks]
+    hosts = rng.integers(0, len(IMAGE_HOSTS), n_rows)
+    image_ids = rng.integers(0, 999999, n_rows)
+    image_urls = [
+        IMAGE_HOSTS[h].format(id=i, year=y, make=mk.lower(), model=md.lower().replace(' ', '-'))
+        for h, i, y, mk, md in zip(hosts, image_ids, year, makers, models)
+    ]
+
+    return pd.DataFrame({
+        'Maker': makers,
+        'Genmodel': models,
+        'Genmodel_ID': table['Genmodel_ID'].to_numpy()[picks],
+        'Year': year,
+        'Entry_price': price,
+        'mileage': mileage,
+        'Image_url': image_urls,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, required=True, help='Number of listings')
+    parser.add_argument('--out', required=True, help='Output CSV path')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--multi-make', action='store_true', help='Include makes other than Toyota')
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.rows, seed=args.seed, multi_make=args.multi_make)
+    catalog.to_csv(args.out, index=False)
+    print(f"✅ Wrote {len(catalog)} listings to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
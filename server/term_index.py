@@ -0,0 +1,271 @@
+"""
+Typo-tolerant term index for chat search.
+
+An inverted index maps normalized terms (catalog model names, the models
+the query parser knows about, and the parser's feature, use-case and body
+type vocabulary) to what they mean. A character-trigram index over the
+same terms finds candidate spellings for words that are not in the
+vocabulary, so "highlandr", "rav 4" or "hybird" still resolve, each with a
+similarity score. Only terms sharing a trigram with the query word are
+ever compared, so lookups stay cheap however large the vocabulary gets.
+"""
+
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from query_parser import (
+    BODY_TYPE_TERMS, CHEAP_WORDS, FEATURE_TERMS, MODEL_PATTERNS, RANGE_PATTERNS,
+    SINGLE_PATTERNS, USE_CASE_TERMS,
+)
+
+# Words shorter than this are only matched exactly
+MIN_FUZZY_LENGTH = 4
+
+# Minimum similarity (1 - edit distance / length) for a fuzzy match
+MIN_SIMILARITY = 0.75
+
+# Words up to this long only fuzzy-match terms starting with the same
+# SHORT_WORD_PREFIX letters; one edit is a large share of a short word
+# ("carry" is one letter from "camry")
+SHORT_WORD_LENGTH = 6
+SHORT_WORD_PREFIX = 3
+
+# Ordinary words that are never read as misspelled vocabulary, on top of
+# the words of the query parser's own terms
+COMMON_WORDS = frozenset('''
+    a about after all also am an and any anything are around as at away back
+    be because been best better big bring buy by came can care carry cars
+    come could day did do does dog dogs down drive driver each else even
+    every few find first for from get give go going good got great had has
+    have he her here high him his home how i if in into is it its just keep
+    kid know last like little long look looking lot lots love make many may
+    me might more most much must my need new next nice no not now of off
+    old on one only or other our out over own people pick please put quite
+    really ride road room same say see seat seats seem show small so some
+    something soon still stuff such take than that the their them then
+    there these they thing things think this those three through time to
+    too trip two up us use used very want wants was way we well were what
+    when where which while who why will wife with would year years yes you
+    your
+'''.split())
+
+# Longest run of query words tried as one term ("land cruiser colorado")
+MAX_SPAN_WORDS = 3
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize_term(text: str) -> str:
+    """Lowercase and drop everything but letters and digits ("C-HR" -> "chr")"""
+    return ''.join(_WORD_RE.findall(text.lower()))
+
+
+def _trigrams(term: str) -> set:
+    padded = f'${term}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (adjacent transpositions count as one
+    edit), or `limit + 1` as soon as it is known to exceed `limit`
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class TermIndex:
+    """
+    Exact and fuzzy lookup of query words against a fixed vocabulary.
+
+    Each vocabulary term maps to a list of targets. A target of None marks
+    a word the query parser already understands (e.g. "under"); matching
+    it only stops the word from being misread as something else. Query
+    words in `known_words` are only ever matched exactly.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]], known_words: Iterable[str] = ()):
+        """
+        Args:
+            entries: (term, target) pairs; terms are normalized here
+            known_words: Correctly spelled words that must not fuzzy-match
+                a term (ordinary English, parser vocabulary)
+        """
+        self.known_words = frozenset(word.lower() for word in known_words)
+        self.targets: Dict[str, List[Any]] = {}
+        for term, target in entries:
+            term = normalize_term(term)
+            if term:
+                targets = self.targets.setdefault(term, [])
+                if target not in targets:
+                    targets.append(target)
+
+        self.terms = list(self.targets)
+        postings: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in _trigrams(term):
+                postings.setdefault(gram, []).append(term_id)
+        self.postings = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, word: str) -> Optional[Tuple[str, float]]:
+        """
+        Closest vocabulary term for a normalized word
+
+        Args:
+            word: Normalized query word (or several words joined together)
+
+        Returns:
+            (term, similarity) with similarity 1.0 for an exact hit, or None
+            when no term is similar enough
+        """
+        if word in self.targets:
+            return word, 1.0
+        if len(word) < MIN_FUZZY_LENGTH:
+            return None
+
+        # Candidates are the terms sharing at least one trigram with the word
+        grams = _trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        # One edit changes at most four padded trigrams (a transposition),
+        # so terms sharing fewer cannot be within max_distance
+        max_distance = int(len(word) * (1 - MIN_SIMILARITY))
+        min_shared = len(grams) - 4 * max_distance
+        best = None
+        for term_id, count in shared.items():
+            term = self.terms[term_id]
+            if count < min_shared or len(term) < MIN_FUZZY_LENGTH or abs(len(term) - len(word)) > max_distance:
+                continue
+            if len(word) <= SHORT_WORD_LENGTH and term[:SHORT_WORD_PREFIX] != word[:SHORT_WORD_PREFIX]:
+                continue
+            distance = _edit_distance(word, term, max_distance)
+            if distance <= max_distance:
+                similarity = 1 - distance / max(len(word), len(term))
+                if similarity >= MIN_SIMILARITY and (best is None or similarity > best[1]):
+                    best = (term, similarity)
+        return best
+
+    def match(self, query: str) -> List[Tuple[Any, float, bool]]:
+        """
+        Find vocabulary terms in a query
+
+        Runs of up to MAX_SPAN_WORDS words are tried joined together, longest
+        first, and each word is used by at most one match. All exact matches
+        are taken before any fuzzy ones, and runs containing a known word
+        are never fuzzy-matched.
+
+        Args:
+            query: Raw user query
+
+        Returns:
+            (target, similarity, exact) for every matched target
+        """
+        words = _WORD_RE.findall(query.lower())
+        used = [False] * len(words)
+        matches = []
+
+        for exact_pass in (True, False):
+            for span in range(min(MAX_SPAN_WORDS, len(words)), 0, -1):
+                for start in range(len(words) - span + 1):
+                    if any(used[start:start + span]):
+                        continue
+                    word = ''.join(words[start:start + span])
+                    if exact_pass:
+                        hit = (word, 1.0) if word in self.targets else None
+                    elif any(w in self.known_words for w in words[start:start + span]):
+                        continue
+                    else:
+                        hit = self.lookup(word)
+                    if hit is None:
+                        continue
+                    term, similarity = hit
+                    used[start:start + span] = [True] * span
+                    for target in self.targets[term]:
+                        if target is not None:
+                            matches.append((target, similarity, exact_pass))
+        return matches
+
+    def intent_matches(self, query: str, intent: Dict[str, Any]) -> Dict[str, list]:
+        """
+        Term matches the query parser missed
+
+        Args:
+            query: Raw user query
+            intent: Intent parsed from the same query by parse_query
+
+        Returns:
+            Dictionary with fuzzy_models, a list of (model name, similarity),
+            and fuzzy_tags, a list of ((intent field, value), similarity)
+        """
+        parsed_models = [model.lower() for model in intent['model_names']]
+        models = {}
+        tags = {}
+        for target, similarity, exact in self.match(query):
+            kind, value = target
+            if kind == 'model':
+                # Overlaps with a parsed model ("land cruiser" inside
+                # "land cruiser amazon") were already scored by the parser
+                name = value.lower()
+                if any(name in parsed or parsed in name for parsed in parsed_models):
+                    continue
+                models[value] = max(similarity, models.get(value, 0.0))
+            else:
+                # Correctly spelled vocabulary is the parser's job
+                if exact or value in intent[kind]:
+                    continue
+                tags[target] = max(similarity, tags.get(target, 0.0))
+        return {
+            'fuzzy_models': sorted(models.items()),
+            'fuzzy_tags': sorted(tags.items()),
+        }
+
+
+def build_term_index(model_names: Iterable[str]) -> TermIndex:
+    """
+    Term index over catalog model names and the query parser vocabulary
+
+    Args:
+        model_names: Distinct model names in the catalog
+
+    Returns:
+        TermIndex whose targets are ('model', name) or (intent field, value)
+    """
+    entries = []
+    known_words = set(COMMON_WORDS)
+    for model in list(model_names) + [model for model, _ in MODEL_PATTERNS]:
+        entries.append((model, ('model', model)))
+    for field, vocabulary in (
+        ('features', FEATURE_TERMS),
+        ('use_cases', USE_CASE_TERMS),
+        ('body_types', BODY_TYPE_TERMS),
+    ):
+        for value, terms in vocabulary.items():
+            for term in terms:
+                entries.append((term, (field, value)))
+                known_words.update(_WORD_RE.findall(term.lower()))
+
+    # Price words and cheap words are handled by the parser itself
+    price_words = [trigger for trigger, _ in RANGE_PATTERNS + SINGLE_PATTERNS if trigger not in ('#', '$')]
+    for word in price_words + CHEAP_WORDS:
+        entries.append((word, None))
+        known_words.update(_WORD_RE.findall(word))
+    return TermIndex(entries, known_words)
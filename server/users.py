@@ -2,6 +2,9 @@ from flask import jsonify, request
 from firebase_admin import auth, firestore
 import firebase_admin.exceptions as firebase_exceptions
 
+from cars import schedule_user_cars_sync
+from http_cache import data_versions, not_modified, user_etag, with_etag
+
 def register_users_routes(app):
     """
     Register users routes with the Flask app.
@@ -57,6 +60,12 @@ def register_users_routes(app):
                     'email': user_record.email,
                     'display_name': user_record.display_name
                 }, merge=True)
+                data_versions.bump('user', uid)
+
+                # Bring the stored recommendations in line with the new
+                # budget and credit score before the user opens Comparison
+                if budget and credit_score:
+                    schedule_user_cars_sync(uid)
 
                 return jsonify({
                     'success': True,
@@ -112,6 +121,18 @@ def get_users_routes(app):
                     'message': 'User UID is required'
                 }), 400
             
+            # Repeat loads: if the client already has the current profile,
+            # answer 304 without asking Firebase
+            user_version = data_versions.get('user', uid)
+            if user_version:
+                cached = not_modified(user_etag('user', user_version))
+                if cached is not None:
+                    return cached
+
+            # Taken before reading, so a concurrent update is never tagged
+            # with the version from before it
+            user_version = data_versions.ensure('user', uid)
+
             # Get user record from Firebase Admin SDK
             try:
                 user_record = auth.get_user(uid)
@@ -134,10 +155,10 @@ def get_users_routes(app):
                     user_data['budget'] = firestore_data.get('budget')
                 
                 # Return user information
-                return jsonify({
+                return with_etag((jsonify({
                     'success': True,
                     'user': user_data
-                }), 200
+                }), 200), user_etag('user', user_version))
                 
             except firebase_exceptions.NotFoundError:
                 return jsonify({
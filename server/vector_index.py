@@ -0,0 +1,395 @@
+"""
+Offline semantic retrieval for chat search.
+
+Catalog rows are described by short documents (model name, maker, body
+type and its synonyms, model tags such as "hybrid" or "family", year, and
+price and mileage bands). Rows that produce the same document share one
+vector, so a million-row inventory still has only a few thousand vectors.
+
+Documents and queries are embedded with hashed word and character n-gram
+TF-IDF features, so nothing needs to be downloaded and everything runs on
+CPU. Vectors are written once per catalog version to .npy files and read
+back memory-mapped; a manifest written after them marks the set complete.
+Small vector sets are searched by brute force; large ones use an
+inverted-file (IVF) index built with spherical k-means.
+"""
+
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from query_parser import BODY_TYPE_TERMS, FEATURE_TERMS, USE_CASE_TERMS
+
+# Bump when document text or features change, to invalidate cached vectors
+DOCUMENT_FORMAT = 2
+
+# Vector sets of one feature space kept in a cache directory. The directory
+# may be shared by several catalogs and worker processes, so a few recent
+# sets survive rather than only the one this process just wrote.
+CACHE_KEEP_SETS = 3
+
+# Words added to documents for each model tag and body type
+TAG_WORDS = {
+    'hybrid': FEATURE_TERMS['hybrid'],
+    'efficient': FEATURE_TERMS['fuel efficient'],
+    'family': FEATURE_TERMS['family'] + USE_CASE_TERMS['family'],
+    'spacious': FEATURE_TERMS['spacious'],
+    'truck': BODY_TYPE_TERMS['truck'],
+    'commute': USE_CASE_TERMS['commuting'],
+    'off-road': USE_CASE_TERMS['off-road'],
+}
+BODY_TYPE_WORDS = {body_type.lower(): terms for body_type, terms in BODY_TYPE_TERMS.items()}
+
+# Price and mileage bands: (upper bound, words). Price bounds are catalog
+# price quantiles, mileage bounds are miles.
+PRICE_BANDS = [
+    (0.3, 'cheap affordable budget inexpensive'),
+    (0.8, 'mid-range'),
+    (1.0, 'premium luxury expensive high-end'),
+]
+MILEAGE_BANDS = [
+    (50000, 'low mileage'),
+    (150000, ''),
+    (float('inf'), 'high mileage'),
+]
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# Numbers, prices and decades ("30", "000", "30k", "2010s"); model names
+# with digits ("rav4", "gt86") are kept
+_NUMBER_WORD_RE = re.compile(r'\d+[ks]?')
+
+
+def query_words(text: str) -> Tuple[str, ...]:
+    """
+    The words a query's semantic vector is built from, sorted and without
+    duplicates. Numbers are dropped (the rule scorer matches prices and
+    years exactly) and plurals made singular, so "cheap SUV under 30k" and
+    "SUVs under $30,000 cheap" get the same words and the same vector.
+    """
+    words = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if _NUMBER_WORD_RE.fullmatch(word):
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+            word = word[:-1]
+        words.add(word)
+    return tuple(sorted(words))
+
+
+class HashingEncoder:
+    """
+    Stateless text featurizer: word unigrams plus character n-grams of
+    each word, hashed into `dim` signed buckets. Purely numeric words are
+    skipped.
+    """
+
+    def __init__(self, dim: int = 2048, char_ngrams: Tuple[int, int] = (3, 4)):
+        """
+        Args:
+            dim: Number of hash buckets (vector length)
+            char_ngrams: Smallest and largest character n-gram length
+        """
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+
+    @property
+    def signature(self) -> str:
+        """Identifies the feature space, for cache file names"""
+        return f'd{self.dim}-c{self.char_ngrams[0]}{self.char_ngrams[1]}-f{DOCUMENT_FORMAT}'
+
+    def features(self, text: str) -> List[str]:
+        """Feature strings for a text"""
+        features = []
+        low, high = self.char_ngrams
+        for word in _WORD_RE.findall(text.lower()):
+            # Prices and years are matched exactly by the rule scorer; as
+            # n-grams they would only make "25,000" look like "2000"
+            if word.isdigit():
+                continue
+            features.append('w:' + word)
+            padded = f' {word} '
+            for n in range(low, high + 1):
+                features.extend('c:' + padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def counts(self, text: str) -> np.ndarray:
+        """Signed hashed feature counts of a text"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            # crc32 rather than hash(), which is salted per process
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        return vector
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Cluster unit vectors by cosine similarity, return unit centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    Semantic similarity between a query and every catalog row.
+
+    `doc_codes` maps each catalog row to its document; `vectors` holds one
+    unit-length TF-IDF vector per document (memory-mapped when a cache
+    directory is used).
+    """
+
+    def __init__(
+        self,
+        index,
+        encoder: Optional[HashingEncoder] = None,
+        cache_dir: Optional[str] = None,
+        ivf_min_docs: int = 4096,
+        nprobe: int = 8,
+        min_similarity: float = 0.05,
+    ):
+        """
+        Build or load the vectors for a catalog index
+
+        Args:
+            index: CatalogIndex to describe
+            encoder: Text featurizer (defaults to HashingEncoder())
+            cache_dir: Directory for the .npy vector files, or None to keep
+                vectors in memory only
+            ivf_min_docs: Use an IVF index once there are this many documents
+            nprobe: IVF lists searched per query
+            min_similarity: Similarities below this are treated as 0, so
+                hash collisions never reorder unrelated cars
+        """
+        self.encoder = encoder or HashingEncoder()
+        self.nprobe = nprobe
+        self.min_similarity = min_similarity
+        doc_keys, self.doc_codes = self._document_keys(index)
+
+        prefix = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            key_hash = hashlib.sha1(doc_keys.tobytes()).hexdigest()[:12]
+            prefix = os.path.join(cache_dir, f'{index.version or "catalog"}-{key_hash}-{self.encoder.signature}')
+
+        arrays = self._load(prefix) if prefix is not None else None
+        if arrays is None:
+            arrays = self._build(index, doc_keys, ivf_min_docs)
+            if prefix is not None:
+                self._save(prefix, arrays)
+                self._remove_stale(cache_dir, prefix, self.encoder.signature)
+                arrays = self._load(prefix) or arrays
+        self.vectors = arrays['vectors']
+        self.idf = np.asarray(arrays['idf'])
+        self.centroids = arrays.get('centroids')
+        self.list_docs = arrays.get('list_docs')
+        self.list_offsets = arrays.get('list_offsets')
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @staticmethod
+    def _price_band_bounds(index) -> np.ndarray:
+        return np.array([index.stats.price_quantile(bound) for bound, _ in PRICE_BANDS])
+
+    @classmethod
+    def _document_keys(cls, index) -> Tuple[np.ndarray, np.ndarray]:
+        """Distinct (model, year, price band, mileage band) rows, and each row's key number"""
+        price_band = np.searchsorted(cls._price_band_bounds(index), index.price)
+        price_band = np.minimum(price_band, len(PRICE_BANDS) - 1)
+        if index.mileage is not None:
+            mileage_band = np.searchsorted([bound for bound, _ in MILEAGE_BANDS], index.mileage)
+        else:
+            mileage_band = np.full(len(index), 1)
+        if len(index) == 0:
+            return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Pack the four columns into one integer per row; a 1-D unique is
+        # much faster than np.unique(axis=0) on large catalogs
+        min_year = index.stats.min_year
+        radix = [index.stats.max_year - min_year + 1, len(PRICE_BANDS), len(MILEAGE_BANDS)]
+        packed = index.model_codes.astype(np.int64)
+        for column, size in zip([index.year - min_year, price_band, mileage_band], radix):
+            packed = packed * size + column
+        unique, doc_codes = np.unique(packed, return_inverse=True)
+
+        columns = []
+        for size in reversed(radix):
+            unique, column = np.divmod(unique, size)
+            columns.append(column)
+        doc_keys = np.column_stack([unique] + columns[::-1])
+        doc_keys[:, 1] += min_year
+        return doc_keys, doc_codes.reshape(-1).astype(np.int32)
+
+    @staticmethod
+    def _model_texts(index) -> List[str]:
+        """Text shared by every document of a model"""
+        _, first_rows = np.unique(index.model_codes, return_index=True)
+        makers = index.df['Maker'].to_numpy() if 'Maker' in index.df.columns else None
+        texts = []
+        for code, row in enumerate(first_rows):
+            body_type = index.model_body_types[code]
+            words = [index.model_names[code], body_type.lower()]
+            words += BODY_TYPE_WORDS.get(body_type.lower(), [])
+            if makers is not None:
+                words.append(str(makers[row]))
+            for tag, tag_words in TAG_WORDS.items():
+                if index.model_tags[code, index.tag_columns[tag]]:
+                    words += tag_words
+            texts.append(' '.join(words))
+        return texts
+
+    def _build(self, index, doc_keys: np.ndarray, ivf_min_docs: int) -> Dict[str, np.ndarray]:
+        # Features never span words, so a document's counts are the sum of
+        # its parts' counts; each model, year and band is hashed only once
+        encode = self.encoder.counts
+        max_year = index.stats.max_year
+        model_counts = np.array([encode(text) for text in self._model_texts(index)]).reshape(-1, self.encoder.dim)
+        years, year_codes = np.unique(doc_keys[:, 1], return_inverse=True)
+        year_counts = np.array([
+            encode(f"{year} {'new recent' if year >= max_year - 5 else 'older'}") for year in years
+        ]).reshape(-1, self.encoder.dim)
+        price_counts = np.array([encode(words) for _, words in PRICE_BANDS])
+        mileage_counts = np.array([encode(words) for _, words in MILEAGE_BANDS])
+        counts = (
+            model_counts[doc_keys[:, 0]]
+            + year_counts[year_codes.reshape(-1)]
+            + price_counts[doc_keys[:, 2]]
+            + mileage_counts[doc_keys[:, 3]]
+        )
+
+        # Document frequency counts every catalog row, not just distinct documents
+        rows_per_doc = np.bincount(self.doc_codes, minlength=len(doc_keys)).astype(np.float32)
+        doc_freq = rows_per_doc @ (counts != 0)
+        idf = (np.log((1 + len(index)) / (1 + doc_freq)) + 1).astype(np.float32)
+        arrays = {'vectors': _normalize_rows(counts * idf).astype(np.float32), 'idf': idf}
+
+        if len(doc_keys) >= ivf_min_docs:
+            n_lists = int(np.sqrt(len(doc_keys)))
+            centroids = _spherical_kmeans(arrays['vectors'], n_lists).astype(np.float32)
+            assign = np.argmax(arrays['vectors'] @ centroids.T, axis=1)
+            arrays['centroids'] = centroids
+            arrays['list_docs'] = np.argsort(assign, kind='stable')
+            arrays['list_offsets'] = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return arrays
+
+    @staticmethod
+    def _save(prefix: str, arrays: Dict[str, np.ndarray]):
+        """
+        Write each array, then the manifest listing them. Every file is
+        written then renamed, so readers never see a partial file, and the
+        manifest only appears once all arrays are in place.
+        """
+        for name, array in arrays.items():
+            tmp_path = f'{prefix}.{name}.{os.getpid()}.tmp.npy'
+            np.save(tmp_path, array)
+            os.replace(tmp_path, f'{prefix}.{name}.npy')
+        tmp_path = f'{prefix}.manifest.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sorted(arrays), f)
+        os.replace(tmp_path, f'{prefix}.manifest.json')
+
+    @staticmethod
+    def _load(prefix: str) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays of a complete cache entry, or None if it is missing or incomplete"""
+        try:
+            with open(f'{prefix}.manifest.json') as f:
+                names = json.load(f)
+            if not {'vectors', 'idf'} <= set(names):
+                return None
+            return {name: np.load(f'{prefix}.{name}.npy', mmap_mode='r') for name in names}
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _remove_stale(cache_dir: str, prefix: str, signature: str, keep: int = CACHE_KEEP_SETS):
+        """
+        Delete older vector sets of the same feature space, so hot reloads
+        do not pile them up. The `keep` most recently written sets stay
+        (this one included), so catalogs and workers sharing the directory
+        do not delete each other's current vectors; sets of other feature
+        spaces, e.g. another DOCUMENT_FORMAT during a rolling deploy, are
+        never touched. Temporary files of writes in progress are left
+        alone, and processes still holding older arrays keep their memory
+        maps after the files are unlinked.
+        """
+        current = os.path.basename(prefix)
+        sets = {}
+        for name in os.listdir(cache_dir):
+            set_name = name.split('.', 1)[0]
+            if '.tmp' in name or not set_name.endswith(f'-{signature}'):
+                continue
+            if not (name.endswith('.npy') or name.endswith('.manifest.json')):
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            paths, newest = sets.get(set_name, ([], 0.0))
+            paths.append(path)
+            sets[set_name] = (paths, max(newest, mtime))
+
+        older = sorted((name for name in sets if name != current), key=lambda name: -sets[name][1])
+        for name in older[max(keep - 1, 0):]:
+            for path in sets[name][0]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def encode(self, text: str) -> np.ndarray:
+        """Unit-length TF-IDF vector of a query"""
+        vector = self.encoder.counts(text) * self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def document_similarities(self, query_vector: np.ndarray) -> np.ndarray:
+        """
+        Cosine similarity of a query vector to every document
+
+        With an IVF index only the `nprobe` closest lists are searched and
+        all other documents get 0.
+        """
+        if self.centroids is None:
+            return np.asarray(self.vectors @ query_vector)
+
+        similarities = np.zeros(len(self.vectors), dtype=np.float32)
+        probe = np.argsort(-(self.centroids @ query_vector))[:self.nprobe]
+        # Sorted so the memory-mapped vectors are read front to back
+        docs = np.sort(np.concatenate([
+            self.list_docs[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe
+        ]))
+        similarities[docs] = self.vectors[docs] @ query_vector
+        return similarities
+
+    def similarities(self, query: str) -> np.ndarray:
+        """
+        Semantic similarity of a query to every catalog row
+
+        Args:
+            query: Raw user query
+
+        Returns:
+            Array of cosine similarities in [0, 1], one per catalog row
+        """
+        similarities = self.document_similarities(self.encode(' '.join(query_words(query))))
+        similarities = np.where(similarities >= self.min_similarity, similarities, 0).astype(np.float32)
+        return similarities[self.doc_codes]